@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Time recognising the endings of every headword in the dictionary,
+as the importer (get_variants) and searches (get_uninflected_forms,
+parse_morphology) do, with vortaro/inflection.py as it is now and as it
+was at any git revisions you name, e.g. the one before classify_word:
+
+    $ DJANGO_SETTINGS_MODULE=settings python _benchmark_inflection.py 7856063^
+
+Like _test_parser.py, this needs the full dictionary in word_db.
+Without it, you can time generated words instead:
+
+    $ DJANGO_SETTINGS_MODULE=settings python _benchmark_inflection.py --generated 7856063^
+
+"""
+import imp
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import django
+django.setup()
+
+from vortaro import inflection
+
+REPETITIONS = 5
+
+
+def load_revision(revision):
+    """Return vortaro/inflection.py as it was at the git revision, as a
+    module. It doesn't import anything from the project, so we can load
+    it on its own.
+
+    """
+    source = subprocess.check_output(
+        ['git', 'show', '%s:vortaro/inflection.py' % revision],
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    (handle, path) = tempfile.mkstemp(suffix='.py')
+    try:
+        with os.fdopen(handle, 'w') as source_file:
+            source_file.write(source)
+        return imp.load_source('inflection_%s' % len(sys.modules), path)
+    finally:
+        os.remove(path)
+        if os.path.exists(path + 'c'):
+            os.remove(path + 'c')
+
+
+def split_separately(module):
+    """Return a function that tries each part of speech in turn, as we
+    did before classify_word.
+
+    """
+    def split(word):
+        return [split(word) for split in
+                [module.split_verb, module.split_adjective,
+                 module.split_noun, module.split_adverb]]
+    return split
+
+
+def get_functions(module):
+    """Return (name, function) of everything we time in module."""
+    return [
+        ('split endings', getattr(module, 'classify_word', None) or
+         split_separately(module)),
+        ('get_variants', module.get_variants),
+        ('get_uninflected_forms', module.get_uninflected_forms),
+    ]
+
+
+def get_generated_words():
+    """Return about 18,000 words with every ending we recognise,
+    including the exceptions.
+
+    """
+    consonants = u"bcĉdfgĝhĥjĵklmnprsŝtvz"
+    roots = [u"".join(letters) for letters in
+             itertools.product(consonants, u"aeiou", consonants[:8])]
+    endings = [u"o", u"oj", u"on", u"ojn", u"a", u"aj", u"an", u"ajn",
+               u"e", u"en", u"i", u"is", u"as", u"os", u"us", u"u",
+               u"antaj", u"intoj", u"ata", u"ite", u"ontan"]
+    exceptions = [u"kiu", u"ĉiujn", u"ili", u"ĝis", u"plus", u"kaj", u"ho",
+                  u"do", u"de", u"tre", u"jen", u"ajn", u"oj", u"Simeon"]
+    return ([root + ending for root in roots for ending in endings] +
+            exceptions)
+
+
+def time_function(function, words):
+    """Return the fastest time in milliseconds to call function on
+    every word.
+
+    """
+    timings = []
+    for _ in range(REPETITIONS):
+        start = time.time()
+        for word in words:
+            function(word)
+        timings.append((time.time() - start) * 1000)
+
+    return min(timings)
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    if '--generated' in arguments:
+        arguments.remove('--generated')
+        words = get_generated_words()
+    else:
+        from vortaro.models import Word
+        words = list(Word.objects.values_list('word', flat=True))
+
+    # (column heading, module)
+    versions = ([(revision, load_revision(revision)) for revision in arguments] +
+                [('working tree', inflection)])
+
+    print "%d words" % len(words)
+    print "%-24s" % "ms" + "".join("%14s" % heading
+                                   for (heading, module) in versions)
+    for (i, (name, function)) in enumerate(get_functions(inflection)):
+        print "%-24s" % name + "".join(
+            "%14.1f" % time_function(get_functions(module)[i][1], words)
+            for (heading, module) in versions)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Compare how quickly we serve searches and word pages with Django's
+default SQLite connection and with the serving profile from
+live_settings_example.py (persistent connections, read only, memory
+mapped).
+
+Like _test_parser.py, this needs the full dictionary in word_db:
+
+    $ DJANGO_SETTINGS_MODULE=settings python _benchmark_serving.py
+
+"""
+import time
+import urllib
+
+import django
+django.setup()
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+import live_settings_example
+
+# (name, path) of each page we time
+PAGES = [
+    (u'search: exact', reverse('search_word') + '?' + urllib.urlencode({'s': u'hundo'.encode('utf-8')})),
+    (u'search: inflected', reverse('search_word') + '?' + urllib.urlencode({'s': u'hundojn'.encode('utf-8')})),
+    (u'search: misspelt', reverse('search_word') + '?' + urllib.urlencode({'s': u'hudno'.encode('utf-8')})),
+    (u'search: compound', reverse('search_word') + '?' + urllib.urlencode({'s': u'malsanulejo'.encode('utf-8')})),
+    (u'word: hundo', reverse('view_word', kwargs={'word': u'hundo'})),
+    (u'word: esti', reverse('view_word', kwargs={'word': u'esti'})),
+    (u'api: hundo', reverse('api_view_word', kwargs={'word': u'hundo'})),
+    (u'api: autocomplete', reverse('api_autocomplete', kwargs={'prefix': u'hun'})),
+]
+
+REPETITIONS = 200
+
+# (name, CONN_MAX_AGE, SQLITE_PRAGMAS)
+PROFILES = [
+    ('default', 0, ()),
+    ('serving', live_settings_example.CONN_MAX_AGE,
+     live_settings_example.SQLITE_PRAGMAS),
+]
+
+
+def time_page(client, path):
+    """Return the median time in milliseconds to serve path."""
+    # warm up the in-memory tries and the OS page cache
+    client.get(path)
+
+    timings = []
+    for _ in range(REPETITIONS):
+        start = time.time()
+        response = client.get(path)
+        timings.append((time.time() - start) * 1000)
+        assert response.status_code in (200, 302), response.status_code
+
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def run_profile(conn_max_age, pragmas):
+    connection.close()
+    connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+
+    client = Client(SERVER_NAME='localhost')
+    with override_settings(SQLITE_PRAGMAS=pragmas):
+        results = [time_page(client, path) for (name, path) in PAGES]
+
+    connection.close()
+    return results
+
+
+if __name__ == '__main__':
+    settings.DEBUG = False
+
+    results = [run_profile(conn_max_age, pragmas)
+               for (name, conn_max_age, pragmas) in PROFILES]
+
+    print "%-20s" % "median ms" + "".join(
+        "%12s" % name for (name, conn_max_age, pragmas) in PROFILES)
+    for (i, (page_name, path)) in enumerate(PAGES):
+        print "%-20s" % page_name + "".join(
+            "%12.2f" % profile_results[i] for profile_results in results)
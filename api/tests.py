@@ -1,15 +1,16 @@
 # -*- coding: utf-8 -*-
 from django.core.urlresolvers import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django_test_mixins import HttpCodeTestCase
 
 import json
 
 from vortaro.models import (
-    Word, PrimaryDefinition, Example,
+    Word, PrimaryDefinition, Subdefinition, Example,
     Translation, Variant, Morpheme)
 
-from initialise_database import get_variants
+from initialise_database import (
+    create_spelling_deletions, create_word_document)
 
 def create_word(word):
     """Set up the necessary database entries for us to search for and view
@@ -17,8 +18,8 @@ def create_word(word):
 
     """
     word_obj = Word.objects.create(word=word)
-    for variant in get_variants(word):
-        Variant.objects.create(word=word_obj, variant=variant)
+    variant_obj = Variant.objects.create(word=word_obj, variant=word.lower())
+    create_spelling_deletions(variant_obj)
 
     return word_obj
 
@@ -49,6 +50,14 @@ class WordApiTest(HttpCodeTestCase):
         self.assertHttpOK(response)
         self.assertEqual(response['Content-Type'], 'application/json')
 
+    def test_get_word_not_modified(self):
+        create_word('saluto')
+        url = reverse('api_view_word', args=['saluto'])
+
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
     def test_get_word_404(self):
         response = self.client.get(reverse('api_view_word', args=['no-such-word']))
         self.assertHttpNotFound(response)
@@ -104,6 +113,45 @@ class WordApiTest(HttpCodeTestCase):
         self.assertIn("kodo", translation_json)
         self.assertIn("lingvo", translation_json)
 
+    def test_get_word_stored_document(self):
+        """If we stored the JSON for a word on import, we should serve it
+        with a single query.
+
+        """
+        word_obj = create_word('saluto')
+        definition = PrimaryDefinition.objects.create(word=word_obj, definition="foo bar")
+        Example.objects.create(definition=definition, example="bar baz")
+        create_word_document(word_obj)
+
+        with self.assertNumQueries(1):
+            raw_response = self.client.get(reverse('api_view_word', args=['saluto']))
+
+        self.assertEqual(raw_response['Content-Type'], 'application/json')
+        response = json.loads(raw_response.content)
+        self.assertEqual(response, word_obj.as_json())
+        self.assertEqual(response['difinoj'][0]['ekzemploj'][0]['ekzemplo'], "bar baz")
+
+    def test_get_word_query_count(self):
+        word_obj = create_word('saluto')
+        for i in range(3):
+            definition = PrimaryDefinition.objects.create(
+                word=word_obj, definition="foo bar")
+            Example.objects.create(definition=definition, example="bar baz")
+            subdefinition = Subdefinition.objects.create(
+                root_definition=definition, definition="baz")
+            Translation.objects.create(definition=subdefinition, translation="foo",
+                                       language_code='en', word=word_obj)
+
+        # We haven't stored a document, so we look for one and then
+        # build the JSON from the definition tree.
+        with self.assertNumQueries(9):
+            raw_response = self.client.get(reverse('api_view_word', args=['saluto']))
+
+        response = json.loads(raw_response.content)
+        self.assertEqual(len(response['difinoj']), 3)
+        subdefinition_json = response['difinoj'][2]['pludifinoj'][0]
+        self.assertEqual(subdefinition_json['difino'], "baz")
+
 
 class SearchApiTest(HttpCodeTestCase):
     def test_search(self):
@@ -216,6 +264,34 @@ class SearchApiTest(HttpCodeTestCase):
 
         self.assertEqual(response['malpreciza'], ['hundo'])
 
+    def test_search_imprecise_results_long_word(self):
+        """We used to give up on spelling variations of long words."""
+        create_word('elektrokardiogramo')
+
+        raw_response = self.client.get(
+            reverse('api_search_word', args=['elektrokardiograno']))
+        response = json.loads(raw_response.content)
+
+        self.assertEqual(response['malpreciza'], ['elektrokardiogramo'])
+
+    def test_search_long_term(self):
+        """A very long term used to exhaust the stack spelling it."""
+        response = self.client.get(
+            reverse('api_search_word', args=[u"ch" * 750]))
+        self.assertHttpOK(response)
+
+    def test_search_imprecise_results_two_mistakes(self):
+        for word in ['hundo', 'hundejo', 'fundo']:
+            create_word(word)
+
+        raw_response = self.client.get(
+            reverse('api_search_word', args=['hudno']) + '?distanco=2')
+        response = json.loads(raw_response.content)
+
+        # Ranked by the number of mistakes, and 'hundejo' is three away.
+        self.assertEqual(response['malpreciza'], ['hundo', 'fundo'])
+        self.assertFalse(response['malpreciza_nekompleta'])
+
     def test_search_imprecise_results_sorted(self):
         for word in ['sati', 'savi', 'bati', u'ŝati']:
             create_word(word)
@@ -252,6 +328,7 @@ class SearchApiTest(HttpCodeTestCase):
                 {'vorto': None, 'parto': 'e'},
             ]},
         ])
+        self.assertFalse(response['vortfarado_nekompleta'])
 
     def test_search_translations(self):
         word_obj = create_word("hundo")
@@ -276,3 +353,64 @@ class SearchApiTest(HttpCodeTestCase):
 
         raw_response = self.client.get(reverse('api_search_word', args=['ant']))
         self.assertHttpOK(raw_response)
+
+
+class BrowseApiTest(TestCase):
+    def test_browse(self):
+        for word in [u"ĉu", u"cent", u"dento"]:
+            create_word(word)
+
+        raw_response = self.client.get(reverse('api_browse_words'),
+                                       {'de': u'c', 'al': u'd'})
+        response = json.loads(raw_response.content)
+
+        self.assertEqual(response, {'vortoj': [u'cent', u'ĉu'], 'sekva': None})
+
+
+class AutocompleteApiTest(TestCase):
+    def setUp(self):
+        for word in [u"ŝati", u"ŝafo", u"ŝafido", u"sano", u"ŝanco"]:
+            create_word(word)
+
+    def get_words(self, prefix, **params):
+        raw_response = self.client.get(
+            reverse('api_autocomplete', args=[prefix]), params)
+        return json.loads(raw_response.content)['vortoj']
+
+    def test_autocomplete(self):
+        self.assertEqual(self.get_words(u"ŝa"),
+                         [u"ŝafo", u"ŝati", u"ŝanco", u"ŝafido"])
+
+    def test_autocomplete_writing_systems(self):
+        self.assertEqual(self.get_words(u"sxaf"), [u"ŝafo", u"ŝafido"])
+        self.assertEqual(self.get_words(u"shaf"), [u"ŝafo", u"ŝafido"])
+        self.assertEqual(self.get_words(u"sa"), [u"sano"])
+        self.assertEqual(self.get_words(u"s", nombro=2), [u"sano", u"ŝafo"])
+
+    def test_autocomplete_long_prefix(self):
+        self.assertEqual(self.get_words(u"sh" * 750), [])
+
+    def test_autocomplete_no_queries(self):
+        self.get_words(u"ŝa")
+        with self.assertNumQueries(0):
+            self.get_words(u"ŝaf")
+
+
+@override_settings(INTERNAL_IPS=['127.0.0.1'])
+class ParseCacheStatisticsApiTest(HttpCodeTestCase):
+    def get_statistics(self):
+        raw_response = self.client.get(reverse('api_parse_cache_statistics'))
+        return json.loads(raw_response.content)
+
+    def test_repeated_search_hits(self):
+        create_word(u"hundo")
+        self.client.get(reverse('api_search_word', args=[u"hundo"]))
+        hits = self.get_statistics()['hits']
+
+        self.client.get(reverse('api_search_word', args=[u"Hundo"]))
+        self.assertEqual(self.get_statistics()['hits'], hits + 1)
+
+    @override_settings(INTERNAL_IPS=[])
+    def test_hidden_from_public(self):
+        response = self.client.get(reverse('api_parse_cache_statistics'))
+        self.assertHttpNotFound(response)
@@ -1,11 +1,16 @@
 import json
 
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
+from django.utils.cache import add_never_cache_headers
 
-from vortaro.models import Word, Morpheme, Translation
-from vortaro.esperanto_sort import compare_esperanto_strings
-from vortaro.morphology import canonicalise_word, parse_morphology
+from vortaro.models import (
+    Word, Morpheme, Translation, WordDocument, AUTOCOMPLETE_COUNT)
+from vortaro.morphology import MAX_SEARCH_TERM_LENGTH, canonicalise_word
+from vortaro.parse_cache import get_statistics
+from vortaro.search import search
+from vortaro.spelling import parse_max_distance
 
 
 # TODO: move to Django 1.7, which already provides this.
@@ -16,26 +21,52 @@ class JsonResponse(HttpResponse):
 
 
 def view_word(request, word):
-    word_obj = get_object_or_404(Word, word=word)
+    try:
+        document = WordDocument.objects.get(word_id=word)
+    except WordDocument.DoesNotExist:
+        # The database may have been imported before we stored
+        # documents, so build it from scratch.
+        word_obj = get_object_or_404(Word, word=word)
+        return JsonResponse(word_obj.as_json())
 
-    definition_objs = word_obj.primarydefinition_set.all()
+    return HttpResponse(document.document, content_type='application/json')
 
-    definitions = [definition_obj.as_json() for definition_obj in definition_objs]
+
+# The most words we'll suggest for a prefix.
+MAX_AUTOCOMPLETE_COUNT = 50
+
+
+def autocomplete(request, prefix):
+    try:
+        count = int(request.GET.get('nombro', AUTOCOMPLETE_COUNT))
+    except ValueError:
+        count = AUTOCOMPLETE_COUNT
+    count = max(1, min(count, MAX_AUTOCOMPLETE_COUNT))
+
+    prefix = canonicalise_word(prefix)[:MAX_SEARCH_TERM_LENGTH]
+    return JsonResponse({'vortoj': Word.objects.autocomplete(prefix, count)})
+
+
+def browse_words(request):
+    start = request.GET.get('de', u'').strip()
+    end = request.GET.get('al', u'').strip()
+
+    (words, next_word) = Word.objects.browse(start, end)
 
     return JsonResponse({
-        'vorto': word_obj.word,
-        'difinoj': definitions})
+        'vortoj': [word.word for word in words],
+        'sekva': next_word,
+    })
 
 
 def search_word(request, search_term):
-    search_term = canonicalise_word(search_term)
-    matching_words = Word.objects.find_by_variant(search_term)
-
-    similar_words = set(Word.objects.find_by_variant_fuzzy(search_term))
-    similar_words = similar_words - set(matching_words)
+    search_term = canonicalise_word(search_term)[:MAX_SEARCH_TERM_LENGTH]
+    max_distance = parse_max_distance(request.GET.get('distanco'))
+    results = search(search_term, max_distance)
 
+    parse_results = results.parses
     parsed_words = []
-    for parse_result in parse_morphology(search_term):
+    for parse_result in parse_results:
         printable_parts = []
         for part in parse_result:
             if isinstance(part, Morpheme):
@@ -63,13 +94,36 @@ def search_word(request, search_term):
     translations = [
         {'vorto': trans.word.word, 'traduko': trans.translation,
          'kodo': trans.language_code, 'lingvo': trans.language}
-        for trans in Translation.objects.filter(translation=search_term)
+        for trans in results.translations
     ]
     
-    return JsonResponse({
-        'preciza': [word.word for word in matching_words],
-        'malpreciza': sorted([word.word for word in similar_words],
-                             cmp=compare_esperanto_strings),
+    response = JsonResponse({
+        'preciza': [word.word for word in results.matching_words],
+        'preciza_nekompleta': 'exact' in results.incomplete,
+        'malpreciza': [word.word for word in results.similar_words],
+        'malpreciza_nekompleta': results.similar_truncated,
         'vortfarado': parsed_words,
+        'vortfarado_nekompleta': parse_results.truncated,
         'tradukoj': translations,
+        'tradukoj_nekompleta': 'translations' in results.incomplete,
     })
+
+    # the same search may finish in time later, so don't let clients
+    # keep this one
+    if results.incomplete:
+        add_never_cache_headers(response)
+    return response
+
+
+def parse_cache_statistics(request):
+    """Counters for the parse cache of the worker that served this
+    request, for monitoring. These say more about the server than
+    we'd like to tell everyone, so this only exists for
+    settings.INTERNAL_IPS, or everyone when debugging.
+
+    """
+    if not (settings.DEBUG or
+            request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS):
+        raise Http404
+
+    return JsonResponse(get_statistics())
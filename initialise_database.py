@@ -1,191 +1,610 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import io
 import json
+import multiprocessing
+import time
+from collections import OrderedDict
+from itertools import islice
 
-from django.db import transaction
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
 
-from vortaro.morphology import (
+from vortaro.inflection import (
     is_declinable_adjective, is_declinable_noun, is_declinable_adverb,
-    is_infinitive, is_pronoun,
+    get_variants,
 )
 from vortaro.models import (
     Word, Morpheme, Variant, PrimaryDefinition, Subdefinition, Translation,
-    Example, Remark)
+    Example, Remark, SpellingDeletion, WordDocument)
+from vortaro.database import allow_writes, set_dictionary_version
+from vortaro.esperanto_sort import esperanto_sort_key
+from vortaro.signals import dictionary_changed
+from vortaro.spelling import get_deletions
 
 """A simple script that populates the sqlite database from a JSON dump produced
 by ReVo-utilities. Database must be empty to start with.
 
 """
 
-def to_h_system(word):
-    h_system = {u'ĉ':u'ch', u'Ĉ':u'Ch', u'ĝ':u'gh', u'Ĝ':u'Gh', u'ĥ':u'hh',
-                u'Ĥ':u'Hh', u'ĵ':u'jh', u'Ĵ':u'Jh', u'ŝ':u'sh', u'Ŝ':u'Sh',
-                u'ŭ':u'u', u'Ŭ':u'U'}
-    output = []
-    for letter in list(word):
-        if letter in h_system.keys():
-            output.append(h_system[letter])
-        else:
-            output.append(letter)
-    return ''.join(output)
-
-def to_x_system(word):
-    x_system = {u'ĉ':u'cx', u'Ĉ':u'Cx', u'ĝ':u'gx', u'Ĝ':u'Gx', u'ĥ':u'hx',
-                u'Ĥ':u'Hx', u'ĵ':u'jx', u'Ĵ':u'Jx', u'ŝ':u'sx', u'Ŝ':u'Sx',
-                u'ŭ':u'ux', u'Ŭ':u'Ux'}
-    output = []
-    for letter in list(word):
-        if letter in x_system.keys():
-            output.append(x_system[letter])
+# How many characters of the dump we read at a time.
+READ_SIZE = 64 * 1024
+
+
+class StreamingJsonReader(object):
+    """Reads consecutive JSON values from a file, without loading the
+    whole file into memory. We only hold the unparsed part of the
+    current chunk.
+
+    Every value must be followed by a delimiter or whitespace (as
+    objects, arrays and strings always are), since we can't tell if a
+    number at the end of a chunk is complete.
+
+    """
+    def __init__(self, json_file, read_size=READ_SIZE):
+        self.file = json_file
+        self.read_size = read_size
+        self.buffer = u''
+        self.position = 0
+        self.decoder = json.JSONDecoder()
+
+    def read_more(self):
+        """Add the next chunk of the file to our buffer, discarding what
+        we've already parsed. Returns False at the end of the file.
+
+        """
+        chunk = self.file.read(self.read_size)
+        if not chunk:
+            return False
+
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Return the next character that isn't whitespace, without
+        consuming it, or '' at the end of the file.
+
+        """
+        while True:
+            while (self.position < len(self.buffer) and
+                   self.buffer[self.position].isspace()):
+                self.position += 1
+
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                return u''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("Expected %r at character %d of this chunk, got %r"
+                             % (char, self.position, self.peek()))
+        self.position += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                (value, self.position) = self.decoder.raw_decode(
+                    self.buffer, self.position)
+                return value
+            except ValueError:
+                # The value continues into the next chunk.
+                if not self.read_more():
+                    raise
+
+
+def iter_dictionary(dictionary_file, read_size=READ_SIZE):
+    """Yield (word, entry) pairs from a dump created by ReVo-utilities, one
+    at a time, so memory use doesn't grow with the size of the dump.
+
+    We accept either the usual dump, a single JSON object mapping words
+    to entries, or newline delimited JSON where every line is a [word,
+    entry] array.
+
+    """
+    reader = StreamingJsonReader(dictionary_file, read_size)
+
+    if reader.peek() == u'[':
+        # newline delimited
+        while reader.peek():
+            (word, entry) = reader.read_value()
+            yield (word, entry)
+        return
+
+    reader.expect(u'{')
+    if reader.peek() == u'}':
+        return
+
+    while True:
+        word = reader.read_value()
+        reader.expect(u':')
+        entry = reader.read_value()
+        yield (word, entry)
+
+        if reader.peek() == u',':
+            reader.expect(u',')
         else:
-            output.append(letter)
-    return ''.join(output)
+            reader.expect(u'}')
+            return
+
+# How many rows we hold in memory before writing them to the database.
+BATCH_SIZE = 10000
+
+# How many entries from the dump we hand to worker processes at once.
+WINDOW_SIZE = 5000
+
+
+class BulkWriter(object):
+    """Collects new model instances and writes them to the database in
+    batches, which is much faster than saving them one at a time.
+
+    SQLite can't tell us the IDs of rows inserted in bulk, so we assign
+    primary keys ourselves, counting up from the largest ID already in
+    each table. This lets us set foreign keys on objects before
+    they're written.
+
+    """
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        # model -> instances not yet written, in the order we first
+        # saw each model, so rows are written before rows that refer
+        # to them
+        self.pending = OrderedDict()
+        self.pending_count = 0
+        self.next_ids = {}
+        self.rows_written = 0
+        self.start_time = time.time()
+
+    def add(self, obj):
+        model = type(obj)
+        parents = model._meta.get_parent_list()
+
+        # Inherited models (e.g. PrimaryDefinition) share IDs with the
+        # table they inherit from.
+        root_model = parents[-1] if parents else model
+        if isinstance(root_model._meta.pk, models.AutoField) and obj.pk is None:
+            obj_id = self.next_id(root_model)
+            for table_model in [model] + parents:
+                setattr(obj, table_model._meta.pk.attname, obj_id)
+
+        self.pending.setdefault(model, []).append(obj)
+        self.pending_count += 1
+        if self.pending_count >= self.batch_size:
+            self.flush()
+
+    def next_id(self, model):
+        if model not in self.next_ids:
+            max_id = model.objects.aggregate(models.Max('pk'))['pk__max']
+            self.next_ids[model] = (max_id or 0) + 1
+
+        obj_id = self.next_ids[model]
+        self.next_ids[model] += 1
+        return obj_id
+
+    def flush(self):
+        """Write every pending row to the database."""
+        for (model, objs) in self.pending.items():
+            insert_rows(model, objs)
+            self.rows_written += len(objs)
+
+        self.pending = OrderedDict()
+        self.pending_count = 0
+
+        elapsed = time.time() - self.start_time
+        print "Wrote %d rows (%d rows/sec)" % (
+            self.rows_written, self.rows_written / max(elapsed, 0.001))
+
+
+def insert_rows(model, objs):
+    """Insert these instances of model with executemany. Unlike
+    bulk_create, this works for models that inherit from other models,
+    and has no limit on the number of rows.
+
+    """
+    quote_name = connection.ops.quote_name
+    cursor = connection.cursor()
+
+    # parents first, so rows for inherited models are inserted into
+    # each table they span
+    for table_model in list(reversed(model._meta.get_parent_list())) + [model]:
+        fields = table_model._meta.local_concrete_fields
+        sql = "INSERT INTO %s (%s) VALUES (%s)" % (
+            quote_name(table_model._meta.db_table),
+            ", ".join(quote_name(field.column) for field in fields),
+            ", ".join(["%s"] * len(fields)))
+
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(getattr(obj, field.attname), connection)
+             for field in fields]
+            for obj in objs])
 
-def get_variants(word):
-    """Given a word, return a list of every possible legitimate
-    spelling of it, in every tense, declension and writing system.
 
-    We generate all our variants in lower case. Since we search over
-    the variants, this gives us a case insensive search.
+def get_spelling_deletions(variant_obj):
+    """Return SpellingDeletion instances to add this variant to the index
+    we use for spell checking.
 
     """
-    # the word itself is a variant
-    word = word.lower()
-    variants = [word]
+    return [SpellingDeletion(variant=variant_obj, deletion=deletion)
+            for deletion in get_inflection_deletions(variant_obj.variant)]
 
-    # every tense and declension
-    if is_infinitive(word):
-        root = word[:-1]
-        variants.extend([root + 'is', root + 'as', root + 'os', 
-                          root + 'us', root + 'u'])
-    elif is_declinable_adjective(word):
-        variants.extend([word + 'j', word + 'n', word + 'jn'])
-    elif is_declinable_noun(word):
-        variants.extend([word + 'j', word + 'n', word + 'jn'])
-    elif is_declinable_adverb(word):
-        variants.extend([word + 'n'])
-    elif is_pronoun(word):
-        variants.extend([word + 'n'])
+def get_inflection_deletions(variant):
+    """Return the deletions of every inflection of variant, so misspelt
+    searches for e.g. 'hudnojn' still find 'hundo'.
 
-    # add additional variants if they are different in other writing
-    # systems
-    different = []
-    for word in variants:
-        if word != to_x_system(word):
-            different.append(to_x_system(word))
-        if word != to_h_system(word):
-            different.append(to_h_system(word))
+    """
+    deletions = set()
+    for inflection in get_variants(variant):
+        deletions.update(get_deletions(inflection))
+    return deletions
+
+def create_spelling_deletions(variant_obj):
+    """Add this variant to the index we use for spell checking."""
+    SpellingDeletion.objects.bulk_create(get_spelling_deletions(variant_obj))
 
-    variants.extend(different)
+@transaction.atomic
+def populate_spelling_deletions(batch_size=BATCH_SIZE):
+    """Rebuild the spell checking index from the variants already in the
+    database, for databases created before we had one.
+
+    """
+    SpellingDeletion.objects.all().delete()
 
-    return variants
+    writer = BulkWriter(batch_size)
+    for variant_obj in Variant.objects.all().iterator():
+        for deletion_obj in get_spelling_deletions(variant_obj):
+            writer.add(deletion_obj)
 
-def get_all_spellings(word):
-    """Return a list of all the ways this word can be written according to
-    all Esperanto writing systems.
+    writer.flush()
 
-    >>> get_all_spellings("eĥo")
-    set(['eĥo', 'eho', 'ehxo'])
+def get_word_document(word_obj):
+    """Return a WordDocument holding the JSON that the API serves for
+    this word, built from the database. Imports build it from the dump
+    instead (see get_entry_document).
 
     """
-    return set([word, to_h_system(word), to_x_system(word)])
+    return WordDocument(word=word_obj, document=json.dumps(word_obj.as_json()))
 
+def create_word_document(word_obj):
+    """Store the JSON that the API serves for this word."""
+    get_word_document(word_obj).save()
 
 @transaction.atomic
-def populate_database(dictionary):
-    """Given a dictionary file from a JSON dump created by
-    ReVo-utilities, write its contents to the database.
+def populate_word_documents(batch_size=BATCH_SIZE):
+    """Store the API JSON for every word in the database. We do this once
+    all the definitions have been written.
 
-    We only commit once because it would take hours if we commit every
-    object separately.
+    """
+    WordDocument.objects.all().delete()
+
+    writer = BulkWriter(batch_size)
+    for word_obj in Word.objects.all().iterator():
+        writer.add(get_word_document(word_obj))
+
+    writer.flush()
+
+def get_entry_document(word, definitions):
+    """Return the JSON that the API serves for word, as Word.as_json()
+    would give it, from the definitions that prepare_entry flattened.
+    This needs no queries, unlike building it once we've written the
+    word.
 
     """
+    def examples_json(examples):
+        return [Example(example=example, source=source).as_json()
+                for (example, source) in examples]
+
+    def translations_json(translations):
+        return [Translation(language_code=language_code,
+                            translation=translation).as_json()
+                for (language_code, translation) in translations]
+
+    return json.dumps({
+        'vorto': word,
+        'difinoj': [
+            {'difino': definition,
+             'ekzemploj': examples_json(examples),
+             'pludifinoj': [
+                 {'difino': subdefinition,
+                  'ekzemploj': examples_json(sub_examples)}
+                 for (subdefinition, sub_examples, sub_translations)
+                 in subdefinitions],
+             'tradukoj': translations_json(translations)}
+            for (definition, subdefinitions, examples, remarks, translations)
+            in definitions],
+    })
+
+def get_entry_hash(entry):
+    """Return a hash of this dictionary entry, so we can tell if it has
+    changed since we imported it.
+
+    """
+    return hashlib.sha1(json.dumps(entry, sort_keys=True)).hexdigest()
+
+def prepare_entry(word_and_entry):
+    """Do all the work for a (word, entry) pair from the dump that
+    doesn't need the database: generating variants, spell checking
+    deletions and morphemes, flattening the definitions and building
+    the API's JSON.
+
+    This runs in worker processes, so it takes a single argument and
+    returns plain data for add_entry.
+
+    """
+    (word, entry) = word_and_entry
+
+    # we only store the lower case dictionary form, searches work back
+    # from inflections at query time
+    variant = word.lower()
+    variants = [(variant, sorted(get_inflection_deletions(variant)))]
+
+    definitions = []
+    for definition_dict in entry['definitions']:
+        subdefinitions = [
+            (subdefinition_dict['primary definition'],
+             subdefinition_dict['examples'],
+             flatten_translations(subdefinition_dict['translations']))
+            for subdefinition_dict in definition_dict['subdefinitions']]
+
+        definitions.append((definition_dict['primary definition'],
+                            subdefinitions,
+                            definition_dict['examples'],
+                            definition_dict['remarks'],
+                            flatten_translations(definition_dict['translations'])))
+
+    morphemes = []
+    if entry['primary']:
+        """Primary means we will link to this word when we find
+        the morpheme. For example, we link 'dorm' to 'dormi'
+        although 'dormo' is also in the dictionary. 
+        
+        """
+        # Add roots (e.g. 'dorm'), forbidding those of one
+        # letter since none actually exist in word building.
+        root = entry['root']
+        if len(root) > 1:
+            morphemes.append(root)
+
+    # also add words as morphemes if they end -o or -a
+    if (is_declinable_noun(word) or is_declinable_adjective(word) or
+        is_declinable_adverb(word)):
+        morphemes.append(word)
+
+    return {
+        'word': word,
+        'entry_hash': get_entry_hash(entry),
+        'sort_key': esperanto_sort_key(word),
+        'variants': variants,
+        'definitions': definitions,
+        'morphemes': morphemes,
+        'document': get_entry_document(word, definitions),
+    }
+
+def flatten_translations(translations):
+    """Given a dict of language codes to lists of translations, return a
+    list of (language_code, translation) tuples. We sort by language,
+    so the order doesn't depend on dict ordering.
+
+    """
+    return [(language_code, translation)
+            for (language_code, language_translations) in sorted(translations.items())
+            for translation in language_translations]
+
+def prepare_entries(entries, processes=None):
+    """Yield prepare_entry() of each (word, entry) pair, in the same order,
+    spreading the work over a pool of processes (by default, one per
+    core). We only hand WINDOW_SIZE entries to the pool at a time, so
+    we don't read the whole dump into memory.
+
+    """
+    if processes == 1:
+        for word_and_entry in entries:
+            yield prepare_entry(word_and_entry)
+        return
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        entries = iter(entries)
+        while True:
+            window = list(islice(entries, WINDOW_SIZE))
+            if not window:
+                break
+
+            # imap gives results in order, so the import is the same
+            # however many processes we use.
+            for prepared in pool.imap(prepare_entry, window, chunksize=100):
+                yield prepared
+    finally:
+        pool.terminate()
+
+def add_entry(writer, prepared, seen_morphemes):
+    """Add the rows for an entry from prepare_entry to writer.
+    seen_morphemes is the set of morpheme strings we already have,
+    since we can't have duplicates.
+
+    Returns the new Word.
+
+    """
+    word_obj = Word(word=prepared['word'], entry_hash=prepared['entry_hash'],
+                    sort_key=prepared['sort_key'])
+    writer.add(word_obj)
+    writer.add(WordDocument(word=word_obj, document=prepared['document']))
+
+    for (variant, deletions) in prepared['variants']:
+        variant_obj = Variant(word=word_obj, variant=variant)
+        writer.add(variant_obj)
+
+        for deletion in deletions:
+            writer.add(SpellingDeletion(variant=variant_obj, deletion=deletion))
+
+    # add every definition
+    # note this means that the order of definition_id corresponds
+    # to the order of the definitions from ReVo, which is important
+    for (definition, subdefinitions, examples, remarks, translations) in prepared['definitions']:
+        definition_obj = PrimaryDefinition(definition=definition,
+                                           word=word_obj)
+        writer.add(definition_obj)
+
+        # subdefinitions belonging to this definition
+        for (subdefinition, sub_examples, sub_translations) in subdefinitions:
+            subdefinition_obj = Subdefinition(definition=subdefinition,
+                                              root_definition=definition_obj)
+            writer.add(subdefinition_obj)
+
+            # now all examples associated with this subdefinition
+            for (example, source) in sub_examples:
+                writer.add(Example(definition=subdefinition_obj,
+                                   example=example, source=source))
+
+            # all translations associated with this subdefinition
+            for (language_code, translation) in sub_translations:
+                writer.add(Translation(word=word_obj, definition=subdefinition_obj,
+                                       translation=translation,
+                                       language_code=language_code))
+
+        # examples belonging to this definition
+        for (example, source) in examples:
+            writer.add(Example(definition=definition_obj, example=example,
+                               source=source))
+
+        # remarks belonging to this definition
+        for remark in remarks:
+            writer.add(Remark(definition=definition_obj, remark=remark))
+
+        # words in other languages which have the same meaning
+        for (language_code, translation) in translations:
+            writer.add(Translation(word=word_obj, definition=definition_obj,
+                                   translation=translation,
+                                   language_code=language_code))
+
+    # add morphemes to initial data
+    for spelling in prepared['morphemes']:
+        if spelling not in seen_morphemes:
+            seen_morphemes.add(spelling)
+            writer.add(Morpheme(primary_word=word_obj, morpheme=spelling))
+
+    return word_obj
+
+@transaction.atomic
+def populate_database(entries, batch_size=BATCH_SIZE, processes=None):
+    """Given the (word, entry) pairs from a JSON dump created by
+    ReVo-utilities, write them to the database. entries may be any
+    iterable, such as iter_dictionary(dictionary_file) or
+    dictionary.items().
+
+    We only commit once, and write rows in batches, because it would
+    take hours if we saved every object separately. The work for each
+    entry is spread over processes (see prepare_entries), and this
+    process writes the results.
+
+    """
+    writer = BulkWriter(batch_size)
 
     # no duplicate morphemes
-    seen_morphemes = {}
-
-    for (word, entry) in dictionary.items():
-
-        word_obj = Word(word=word)
-        word_obj.save()
-
-        # variants (case/declension/tense)
-        for variant in get_variants(word):
-            Variant(word=word_obj, variant=variant).save()
-
-        # add every definition
-        # note this means that the order of definition_id corresponds
-        # to the order of the definitions from ReVo, which is important
-        for definition_dict in entry['definitions']:
-            definition = definition_dict['primary definition']
-            definition_obj = PrimaryDefinition(definition=definition,
-                                               word=word_obj)
-            definition_obj.save()
-
-            # subdefinitions belonging to this definition
-            for subdefinition_dict in definition_dict['subdefinitions']:
-                subdefinition = subdefinition_dict['primary definition']
-                subdefinition_obj = Subdefinition(definition=subdefinition,
-                                                  root_definition=definition_obj)
-                subdefinition_obj.save()
-
-                # now all examples associated with this subdefinition
-                for (example, source) in subdefinition_dict['examples']:
-                    Example(definition=subdefinition_obj,
-                            example=example, source=source).save()
-
-                # all translations associated with this subdefinition
-                for (language_code, translations) in subdefinition_dict['translations'].items():
-                    for translation in translations:
-                        Translation(word=word_obj, definition=subdefinition_obj,
-                                    translation=translation,
-                                    language_code=language_code).save()
-
-            # examples belonging to this definition
-            for (example, source) in definition_dict['examples']:
-                Example(definition=definition_obj, example=example, 
-                        source=source).save()
-
-            # remarks belonging to this definition
-            for remark in definition_dict['remarks']:
-                Remark(definition=definition_obj, remark=remark).save()
-
-            # words in other languages which have the same meaning
-            for (language_code, translations) in definition_dict['translations'].items():
-                for translation in translations:
-                    Translation(word=word_obj, definition=definition_obj,
-                                translation=translation,
-                                language_code=language_code).save()
-
-        # add morphemes to initial data
-        if entry['primary']:
-            """Primary means we will link to this word when we find
-            the morpheme. For example, we link 'dorm' to 'dormi'
-            although 'dormo' is also in the dictionary. 
-            
-            """
-            # Add roots (e.g. 'dorm'), forbidding those of one
-            # letter since none actually exist in word building.
-            root = entry['root']
-            if len(root) > 1:
-                for spelling in get_all_spellings(root):
-                    if spelling not in seen_morphemes:
-                        seen_morphemes[spelling] = True
-                        Morpheme.objects.create(primary_word=word_obj, morpheme=spelling)
-            
-        # also add words as morphemes if they end -o or -a
-        if (is_declinable_noun(word) or is_declinable_adjective(word) or
-            is_declinable_adverb(word)):
-            
-            for spelling in get_all_spellings(word):
-                if spelling not in seen_morphemes:
-                    seen_morphemes[spelling] = True
-                    Morpheme.objects.create(primary_word=word_obj, morpheme=spelling)
+    seen_morphemes = set()
+
+    for prepared in prepare_entries(entries, processes):
+        add_entry(writer, prepared, seen_morphemes)
 
     # add -unt morpheme which isn't in ReVo
-    Morpheme(morpheme='unt').save()
+    writer.add(Morpheme(morpheme='unt'))
+    writer.flush()
+
+    set_dictionary_version()
+
+    # We didn't save rows individually, so nothing has told the
+    # in-memory copies of the dictionary that it's changed.
+    dictionary_changed.send(sender=None)
+
+def delete_word(word_obj, seen_morphemes):
+    """Delete this word and everything that belongs to it, including
+    its morphemes.
+
+    """
+    seen_morphemes.difference_update(
+        word_obj.morpheme_set.values_list('morpheme', flat=True))
+    word_obj.delete()
+
+@transaction.atomic
+def update_database(entries, batch_size=BATCH_SIZE):
+    """Bring an existing database up to date with a new dump. We compare
+    the hash of every entry with the hash we stored when we imported
+    it, and only delete and re-add the rows of words that have
+    changed, so a refresh only takes as long as the changes.
+
+    Note that when a word is deleted, its morphemes aren't handed to
+    other words that could provide them until the next full import.
+
+    """
+    # word -> entry hash, for every word we haven't seen in the new dump
+    unseen_words = dict(Word.objects.values_list('word', 'entry_hash'))
+    seen_morphemes = set(Morpheme.objects.values_list('morpheme', flat=True))
+
+    writer = BulkWriter(batch_size)
+    stats = {'added': 0, 'changed': 0, 'deleted': 0}
+
+    for (word, entry) in entries:
+        if word in unseen_words:
+            old_hash = unseen_words.pop(word)
+            if old_hash == get_entry_hash(entry):
+                continue
+
+            delete_word(Word.objects.get(word=word), seen_morphemes)
+            stats['changed'] += 1
+        else:
+            stats['added'] += 1
+
+        add_entry(writer, prepare_entry((word, entry)), seen_morphemes)
+
+    # anything left is no longer in the dump
+    for word in unseen_words:
+        delete_word(Word.objects.get(word=word), seen_morphemes)
+        stats['deleted'] += 1
+
+    if 'unt' not in seen_morphemes:
+        writer.add(Morpheme(morpheme='unt'))
+    writer.flush()
+
+    set_dictionary_version()
+    dictionary_changed.send(sender=None)
+
+    print "Added %(added)d words, changed %(changed)d, deleted %(deleted)d" % stats
+    return stats
+
+
+def clear_database():
+    """Delete every row of the dictionary, a table at a time, rather
+    than deleting each word and what cascades from it.
+
+    """
+    tables = [model._meta.db_table
+              for model in apps.get_app_config('vortaro').get_models()]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sql_flush(no_style(), tables, ()):
+            cursor.execute(sql)
+
+@transaction.atomic
+def import_dictionary(entries):
+    """Write entries to the database, only updating the words that have
+    changed if we can (see update_database).
+
+    Words imported before we stored entry hashes would all look
+    changed, and deleting them one by one takes far longer than
+    starting again, so then we replace everything.
+
+    """
+    if Word.objects.filter(entry_hash__isnull=True).exists():
+        clear_database()
+        populate_database(entries)
+    elif Word.objects.exists():
+        update_database(entries)
+    else:
+        populate_database(entries)
 
 
 if __name__ == '__main__':
-    dictionary_file = open('dictionary.json', 'r')
-    dictionary = json.load(dictionary_file)
-    populate_database(dictionary)
+    allow_writes()
+    with io.open('dictionary.json', encoding='utf-8') as dictionary_file:
+        import_dictionary(iter_dictionary(dictionary_file))
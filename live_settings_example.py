@@ -1,2 +1,46 @@
 DEBUG = False
 TEMPLATE_DEBUG = DEBUG
+
+# We never write to the dictionary when serving requests, so keep a
+# connection open in each worker, read only, with the whole word_db
+# memory mapped. build_dictionary turns query_only off for itself.
+CONN_MAX_AGE = None
+SQLITE_PRAGMAS = (
+    ('query_only', 'ON'),
+    ('mmap_size', 1024 * 1024 * 1024),
+    # negative means KiB rather than pages
+    ('cache_size', -64 * 1024),
+    ('temp_store', 'MEMORY'),
+)
+
+# Look up exact matches, similar words, parses and translations at the
+# same time, see vortaro/search.py.
+SEARCH_THREADS = 4
+
+# Keep up to 5000 rendered word and search pages in each worker, see
+# vortaro/page_cache.py. Pages are only replaced when we import the
+# dictionary, so they don't need to expire. Use
+# django.core.cache.backends.filesystem.FileBasedCache (with a
+# directory as LOCATION) to share them between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pages',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+PAGE_CACHE_BACKEND = 'pages'
+
+# Share parses of search terms between workers, and wait for other
+# workers doing the same search, see vortaro/parse_cache.py and
+# vortaro/coalesce.py.
+# CACHES['default'] = {
+#     'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+#     'LOCATION': '127.0.0.1:11211',
+# }
+# PARSE_CACHE_BACKEND = 'default'
+# SEARCH_COALESCE_BACKEND = 'default'
@@ -22,6 +22,51 @@ DATABASES = {
     }
 }
 
+# How long to keep database connections open, in seconds. None keeps
+# them open for the life of the worker.
+CONN_MAX_AGE = 0
+
+# (name, value) pairs of PRAGMAs to set on every SQLite connection. See
+# live_settings_example.py for the settings we serve with.
+SQLITE_PRAGMAS = ()
+
+# How many search terms each worker keeps the parses of (see
+# vortaro/parse_cache.py), and optionally which of CACHES to share
+# them between workers with.
+PARSE_CACHE_SIZE = 10000
+PARSE_CACHE_BACKEND = None
+
+# How many threads each worker uses to run the stages of a search at
+# the same time (see vortaro/search.py), and how many seconds each
+# stage may take before we answer without it. With no threads, stages
+# run one after another and always finish.
+SEARCH_THREADS = 0
+SEARCH_TIMEOUTS = {
+    'exact': 2.0,
+    'similar': 0.5,
+    'parses': 0.5,
+    'translations': 2.0,
+}
+
+# Identical searches running at the same time in one worker share
+# their results. Name one of CACHES here to share them between workers
+# too, waiting at most SEARCH_COALESCE_TIMEOUT seconds for another
+# worker's result (see vortaro/coalesce.py).
+SEARCH_COALESCE_BACKEND = None
+SEARCH_COALESCE_TIMEOUT = 5
+
+# Word pages, searches and the API only change when we import the
+# dictionary, so browsers and proxies may keep them for
+# HTTP_CACHE_MAX_AGE seconds and then check whether the dictionary
+# version has changed (see vortaro/middleware.py). Increase
+# HTTP_CACHE_VERSION when a deploy changes how those pages look.
+HTTP_CACHE_MAX_AGE = 60 * 60 * 24
+HTTP_CACHE_VERSION = 1
+
+# Which of CACHES to keep rendered word and search pages in, if any
+# (see vortaro/page_cache.py).
+PAGE_CACHE_BACKEND = None
+
 ALLOWED_HOSTS = ['www.simplavortaro.org', 'localhost', '127.0.0.1', '[::1]']
 
 WSGI_APPLICATION = "wsgi.application"
@@ -85,6 +130,8 @@ MIDDLEWARE_CLASSES = (
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'vortaro.middleware.ReopenDatabaseMiddleware',
+    'vortaro.middleware.DictionaryCacheMiddleware',
 )
 
 ROOT_URLCONF = 'urls'
@@ -113,3 +160,5 @@ try:
     from live_settings import *
 except ImportError:
     pass
+
+DATABASES['default']['CONN_MAX_AGE'] = CONN_MAX_AGE
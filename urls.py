@@ -11,12 +11,16 @@ urlpatterns = [
     url(r'^informo/api$', v.about_the_api, name="about_the_api"),
     url(ur'^serĉo$', v.search_word, name="search_word"),
     url(r'^vorto/(?P<word>.*)$', v.view_word, name="view_word"),
+    url(r'^listo$', v.browse_words, name="browse_words"),
     url(u'^$', v.index, name="index"),
 
     url(u'^api/v1/vorto/(?P<word>.+)$', api.view_word, name="api_view_word"),
     # We're deliberately using a non-UTF8 URL prefix to hopefully make it easier
     # to use the API.
     url(u'^api/v1/trovi/(?P<search_term>.+)$', api.search_word, name="api_search_word"),
+    url(u'^api/v1/listo$', api.browse_words, name="api_browse_words"),
+    url(u'^api/v1/kompletigi/(?P<prefix>.+)$', api.autocomplete, name="api_autocomplete"),
+    url(u'^api/v1/statistiko$', api.parse_cache_statistics, name="api_parse_cache_statistics"),
 ]
 
 if settings.DEBUG:
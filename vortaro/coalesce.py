@@ -0,0 +1,133 @@
+"""Sharing one computation between identical requests that arrive at
+the same time. When a link to a word is shared widely, we get bursts
+of the same search, and there's no point doing the work for each of
+them.
+
+Within a worker, SingleFlight makes every thread asking for the same
+key wait for the first one. Workers can also coordinate through one of
+Django's caches (see shared_single_flight): one worker takes a lock
+and stores its result, and the others wait for it.
+
+"""
+import threading
+import time
+
+
+class _Call(object):
+    """A computation in progress, which other threads can wait for."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight(object):
+    """Make concurrent calls with the same key share one call of the
+    function.
+
+    >>> single_flight = SingleFlight()
+    >>> single_flight.call('key', None, lambda: 42)
+    42
+
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        # how many calls waited for another thread instead of working
+        self.shared = 0
+
+    def call(self, key, timeout, function, *args):
+        """Call function, unless another thread is already doing so for
+        key, in which case wait up to timeout seconds (or forever if
+        timeout is None) for its result. If it takes longer, we call
+        function ourselves.
+
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self.calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not is_leader:
+            if not call.done.wait(timeout):
+                # don't hang with a leader that hangs
+                return function(*args)
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = function(*args)
+        except Exception as e:
+            call.exception = e
+            raise
+        finally:
+            # later calls start afresh, rather than getting this result
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+        return call.result
+
+
+# How often we check whether another worker has finished.
+POLL_INTERVAL = 0.01
+
+# How many seconds we keep a result that is_complete rejected, for the
+# workers that were already waiting for it.
+WAITERS_TIMEOUT = 1
+
+def shared_single_flight(cache, key, timeout, is_complete, function, *args):
+    """Call function, unless another worker is already doing so for
+    key, in which case wait up to timeout seconds for its result.
+
+    cache is one of Django's caches. Its add() must be atomic, as it
+    is for memcached. Results are kept for timeout seconds, so they
+    must be picklable and not None.
+
+    If is_complete is given, results it returns False for (e.g. a
+    search that gave up on a stage) are only shared with the workers
+    already waiting, so later calls try again.
+
+    """
+    result_key = key + ':result'
+    waiters_key = key + ':waiters'
+    lock_key = key + ':lock'
+
+    result = cache.get(result_key)
+    if result is not None:
+        return result
+
+    if cache.add(lock_key, True, timeout):
+        try:
+            result = function(*args)
+            if is_complete is None or is_complete(result):
+                cache.set(result_key, result, timeout)
+            else:
+                cache.set(waiters_key, result, WAITERS_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return result
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+
+        result = cache.get(result_key)
+        if result is not None:
+            return result
+
+        # The other worker has finished, or gave up on an exception.
+        # It stores its result just before releasing the lock.
+        if cache.get(lock_key) is None:
+            result = (cache.get(result_key) or
+                      cache.get(waiters_key))
+            if result is not None:
+                return result
+            break
+
+    # do it ourselves rather than keep the user waiting any longer
+    return function(*args)
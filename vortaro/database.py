@@ -0,0 +1,182 @@
+"""Switching between versions of the word_db file.
+
+We build a new database into a file next to the live one
+(e.g. word_db.20150102030405), then point word_db at it. word_db is a
+symlink, so the switch is a single rename and every process sees
+either the old database or the new one, never a half-built one.
+
+"""
+import glob
+import os
+import re
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from vortaro.esperanto_sort import compare_esperanto_strings
+from vortaro.signals import dictionary_changed
+
+
+def get_database_version(path):
+    """Return a value that changes whenever the file at path is
+    replaced, or None if there's no such file (e.g. an in-memory
+    database).
+
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return (stat.st_dev, stat.st_ino, stat.st_mtime)
+
+
+def reopen_if_replaced(seen, path=None):
+    """Close this thread's database connection if the file at path
+    (word_db by default) has been replaced since this thread last
+    checked, so the next query opens the new one. seen is a
+    threading.local() for remembering the version between calls.
+
+    Returns True if we closed the connection.
+
+    """
+    if path is None:
+        path = connection.settings_dict['NAME']
+
+    version = get_database_version(path)
+    previous_version = getattr(seen, 'version', None)
+    seen.version = version
+
+    if previous_version is not None and version != previous_version:
+        connection.close()
+        return True
+    return False
+
+
+# Versions are named by when they were built, so they sort by age.
+VERSION_FORMAT = "%Y%m%d%H%M%S"
+
+def get_version_path(live_path, version):
+    return "%s.%s" % (live_path, version)
+
+
+def switch_database(live_path, new_path, keep=2):
+    """Atomically make live_path a symlink to new_path, which must be in
+    the same directory. If live_path is a regular file, we keep it as
+    a version too, named by when it was last written.
+
+    We delete all but the newest keep versions, so there's always a
+    previous version to switch back to.
+
+    """
+    if os.path.isfile(live_path) and not os.path.islink(live_path):
+        # a hard link, so live_path never goes missing
+        modified = time.localtime(os.path.getmtime(live_path))
+        os.link(live_path, get_version_path(
+            live_path, time.strftime(VERSION_FORMAT, modified)))
+
+    temporary_link = live_path + ".switching"
+    if os.path.lexists(temporary_link):
+        os.remove(temporary_link)
+
+    # a relative link, so the directory can be moved
+    os.symlink(os.path.basename(new_path), temporary_link)
+    os.rename(temporary_link, live_path)
+
+    remove_old_versions(live_path, keep)
+
+
+def remove_old_versions(live_path, keep=2):
+    """Delete the oldest versions of live_path, leaving the newest keep
+    versions and whichever one is live.
+
+    """
+    live_version = os.path.realpath(live_path)
+    # not journals or the like, just the database files
+    versions = sorted(path for path in glob.glob(live_path + ".*")
+                      if re.search(r"\.\d+$", path))
+
+    for path in versions[:-keep]:
+        if os.path.realpath(path) != live_version:
+            os.remove(path)
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Apply settings.SQLITE_PRAGMAS to every new SQLite connection, and
+    let queries use 'COLLATE esperanto' to sort in Esperanto
+    alphabetical order.
+
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    connection.connection.create_collation(
+        'esperanto', compare_esperanto_strings)
+
+    cursor = connection.cursor()
+    for (name, value) in settings.SQLITE_PRAGMAS:
+        cursor.execute("PRAGMA %s = %s" % (name, value))
+
+    if getattr(connection, 'writes_allowed', False):
+        cursor.execute("PRAGMA query_only = OFF")
+
+
+def allow_writes(database=connection):
+    """Let this thread's connection to database write, even if
+    SQLITE_PRAGMAS makes connections read only. This lasts until the
+    process exits, even if the connection is closed and reopened (as
+    migrate does).
+
+    """
+    database.writes_allowed = True
+    database.cursor().execute("PRAGMA query_only = OFF")
+
+
+def get_dictionary_version():
+    """Return the version stamp that the importer wrote to the
+    database (see set_dictionary_version), or 0 if it has none.
+
+    """
+    if connection.vendor != 'sqlite':
+        return 0
+
+    cursor = connection.cursor()
+    cursor.execute("PRAGMA user_version")
+    return cursor.fetchone()[0]
+
+
+# The version of the dictionary this process is using. Loaded on first
+# use, and whenever the dictionary changes.
+_current_version = None
+
+def get_current_dictionary_version():
+    """Like get_dictionary_version, but without a query every time.
+    Use this to key anything cached from the dictionary.
+
+    """
+    global _current_version
+    if _current_version is None:
+        _current_version = get_dictionary_version()
+    return _current_version
+
+
+def clear_current_dictionary_version(**kwargs):
+    global _current_version
+    _current_version = None
+
+dictionary_changed.connect(clear_current_dictionary_version)
+
+
+def set_dictionary_version():
+    """Stamp the database with a new version, so anything we cached
+    from the previous dictionary (see vortaro.parse_cache) is no longer
+    used. We use the time, so a freshly built database never reuses an
+    old stamp.
+
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    version = max(int(time.time()), get_dictionary_version() + 1)
+    connection.cursor().execute("PRAGMA user_version = %d" % version)
@@ -1,62 +1,78 @@
 # -*- coding: utf-8 -*-
 # this file is part of ReVo-utilities and development happens there
 
+# alphabetical sort of esperanto strings
+# permitting whole latin alphabet (so including q, x etc)
+# falling back on unicode ordering for unknown characters
+
+# we explicitly add ' ' and '-' to the alphabet
+# ' ' is first in the alphabet so 'a b' comes before 'ab'
+# '-' is second so that affixes come first
+alphabet = [u' ', u'-', u'a', u'A', u'b', u'B', u'c', u'C', u'ĉ', u'Ĉ',
+            u'd', u'D', u'e', u'E', u'f', u'F', u'g', u'G', u'ĝ', u'Ĝ',
+            u'h', u'H', u'ĥ', u'Ĥ', u'i', u'I', u'j', u'J', u'ĵ', u'Ĵ',
+            u'k', u'K', u'l', u'L', u'm', u'M', u'n', u'N', u'o', u'O',
+            u'p', u'P', u'q', u'Q', u'r', u'R', u's', u'S', u'ŝ', u'Ŝ',
+            u't', u'T', u'u', u'U', u'ŭ', u'Ŭ', u'v', u'V', u'w', u'W',
+            u'x', u'X', u'y', u'Y', u'z', u'Z']
+
+# In a sort key, each letter in the alphabet is replaced by a
+# character whose code point is its position in the alphabet.
+ranks = dict((letter, unichr(rank + 1)) for (rank, letter) in enumerate(alphabet))
+
+# Comes after every letter in the alphabet. Everything after it in a
+# key is the original string, compared with normal unicode ordering.
+UNKNOWN = u'\x7f'
+
+# Sort keys we've already computed. Most of the strings we sort are
+# words and language names we've seen before.
+_sort_keys = {}
+MAX_CACHED_KEYS = 10000
+
+
+def esperanto_sort_key(mixed_case):
+    """Return a unicode string such that comparing the keys of two
+    strings orders them the same way as compare_esperanto_strings.
+
+    >>> sorted([u'ĉu', u'da', u'cu'], key=esperanto_sort_key)
+    [u'cu', u'\\u0109u', u'da']
+
+    """
+    if type(mixed_case) == str:
+        # need unicode strings or we cannot iterate over them
+        # esperanto uses multibyte characters
+        mixed_case = mixed_case.decode('utf8')
+
+    try:
+        return _sort_keys[mixed_case]
+    except KeyError:
+        pass
+
+    string = mixed_case.strip()
+    key = []
+    for (i, char) in enumerate(string):
+        rank = ranks.get(char)
+        if rank is None:
+            # Once we've reached a character outside the alphabet, we
+            # compare the rest of the string with unicode ordering.
+            key.append(UNKNOWN)
+            key.append(string[i:])
+            break
+
+        key.append(rank)
+
+    key = u''.join(key)
+
+    if len(_sort_keys) >= MAX_CACHED_KEYS:
+        _sort_keys.clear()
+    _sort_keys[mixed_case] = key
+
+    return key
+
+
 def compare_esperanto_strings(x_mixed_case, y_mixed_case):
-    # alphabetical sort of esperanto strings
-    # (not unicode strings, normal strings)
-    # permitting whole latin alphabet (so including q, x etc)
-    # falling back on unicode ordering for unknown characters
-
-    # need utf8 strings or we cannot iterate over them
-    # esperanto uses multibyte characters
-    
-    if type(x_mixed_case) == str:
-        x = x_mixed_case.decode('utf8').strip()
-    else:
-        x = x_mixed_case.strip()
-    if type(y_mixed_case) == str:
-        y = y_mixed_case.decode('utf8').strip()
-    else:
-        y = y_mixed_case.strip()
-
-    # we explicitly add ' ' and '-' to the alphabet
-    # ' ' is first in the alphabet so 'a b' comes before 'ab'
-    # '-' is second so that affixes come first
-
-    alphabet = [u' ', u'-', u'a', u'A', u'b', u'B', u'c', u'C', u'ĉ', u'Ĉ',
-                u'd', u'D', u'e', u'E', u'f', u'F', u'g', u'G', u'ĝ', u'Ĝ',
-                u'h', u'H', u'ĥ', u'Ĥ', u'i', u'I', u'j', u'J', u'ĵ', u'Ĵ',
-                u'k', u'K', u'l', u'L', u'm', u'M', u'n', u'N', u'o', u'O',
-                u'p', u'P', u'q', u'Q', u'r', u'R', u's', u'S', u'ŝ', u'Ŝ',
-                u't', u'T', u'u', u'U', u'ŭ', u'Ŭ', u'v', u'V', u'w', u'W',
-                u'x', u'X', u'y', u'Y', u'z', u'Z']
-    
-    for i in range(min(len(x),len(y))):
-        try:
-            if alphabet.index(x[i]) < alphabet.index(y[i]):
-                return -1
-            elif alphabet.index(x[i]) > alphabet.index(y[i]):
-                return 1
-        except ValueError:
-            # not in alphabet
-            if x[i] in alphabet:
-                return -1
-            elif y[i] in alphabet:
-                return 1
-            else:
-                # neither character in alphabet, use normal unicode ordering
-                if x < y:
-                    return -1
-                elif x > y:
-                    return 1
-
-    # if one string is the prefix of the other we reach this point
-
-    # longer strings come afterwards
-    if len(x) < len(y):
-        return -1
-    elif len(x) > len(y):
-        return 1
-    else:
-        # completely identical
-        return 0
+    # alphabetical sort of esperanto strings, as a cmp function.
+    # Prefer sorting with key=esperanto_sort_key, which only works out
+    # the key of each string once.
+    return cmp(esperanto_sort_key(x_mixed_case),
+               esperanto_sort_key(y_mixed_case))
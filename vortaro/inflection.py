@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""Esperanto inflection: recognising the endings of verbs, nouns,
+adjectives and adverbs, generating every inflected form of a word, and
+working back from an inflected form to the dictionary form.
+
+The ending tables below have been cross checked using the following
+commands to find exceptions (singular nouns in this example):
+
+fish> egrep -iw '^.*o$' <word_list.txt | awk '{ print length(), $0 | "sort -n" }' | less
+
+These functions don't use the database, so models can use them too.
+
+"""
+
+VERB = 'verb'
+ADJECTIVE = 'adjective'
+NOUN = 'noun'
+ADVERB = 'adverb'
+
+PRONOUNS = frozenset([u'ci', u'ĝi', u'ili', u'li', u'mi', u'ni', u'oni',
+                      u'ri', u'si', u'ŝi', u'vi'])
+
+# For each part of speech, a dict mapping each ending to a tuple
+# (exceptions, members). Words in exceptions don't have that ending
+# even though they look like they do. If members isn't None, only words
+# in members have that ending.
+
+# We consider every tense, but ignore participles (-anta, -ata etc).
+VERB_ENDINGS = {
+    # *i words that are not verbs:
+    'i': (PRONOUNS | frozenset([
+        u'ĉi', # adverb
+        u'ahi', u'fi', # exclamations
+        u'ĥi', # abbreviation, same as ĥio actually
+        u'-ologi', # affix
+        u'pli', # preposition
+    ]), None),
+    'is': (frozenset([
+        u'bis', # exclamation
+        u'mis', # prefix
+        u'ĝis', # preposition
+        u'Ĝenĝis', u'Ĝinĝis', # names
+    ]), None),
+    # no exceptions as far as I'm aware
+    'as': (frozenset(), None),
+    # also no exceptions it seems
+    'os': (frozenset(), None),
+    'us': (frozenset([
+        u'ĵus', # adverb
+        u'plus', u'minus', # conjunctions
+    ]), None),
+    'u': (frozenset([
+        u'kiu', u'ĉiu', u'tiu', u'neniu', u'iu', # table words
+        u'unu', u'du', # numbers
+        u'fu', # onomatopoeia
+        u'hu', u'nu', # interjections
+        u'ju', u'plu', # adverbs
+        u'ĉu', # conjunction
+    ]), None),
+}
+
+ADJECTIVE_ENDINGS = {
+    'a': (frozenset([
+        u'ta', # onomatopoeia, to be precise it's "ta ta ta"
+        u'hura', u'pa', u'aha', u'ba', u'ha', # exclamations
+        u'tra', u'la', u'ja', # prepositions
+    ]), None),
+    'aj': (frozenset([
+        u'aj', # exclamation
+        u'kaj', # conjunction
+    ]), None),
+    'an': (frozenset([u'Osman', u'Jordan']), None), # names
+    'ajn': (frozenset([u'ajn']), None),
+    # table words ending -u act as adjectives
+    'u': (frozenset(), frozenset([u'kiu', u'ĉiu', u'tiu', u'neniu', u'iu'])),
+    # arguably 'neniuj' doesn't exist, but for the sake of completeness
+    'uj': (frozenset(),
+           frozenset([u'kiuj', u'ĉiuj', u'tiuj', u'neniuj', u'iuj'])),
+    'un': (frozenset(),
+           frozenset([u'kiun', u'ĉiun', u'tiun', u'neniun', u'iun'])),
+    # also arguably 'neniujn' doesn't exist
+    'ujn': (frozenset(),
+            frozenset([u'kiujn', u'ĉiujn', u'tiujn', u'neniujn', u'iujn'])),
+}
+
+NOUN_ENDINGS = {
+    'o': (frozenset([
+        u'ho', # exclamation
+        # we list the prefices for completeness
+        # although they arguably end '-'
+        u'-o', u'bo-', u'geo-',
+        u'do', # conjunction
+        u'po', # preposition
+    ]), None),
+    'oj': (frozenset([u'oj']), None), # exclamation
+    'on': (frozenset([u'Simeon']), None), # name
+    # appears there are no exceptions
+    'ojn': (frozenset(), None),
+}
+
+# I'm not convinced every adverb actually makes sense with an -en
+# ending, but we deal with all the exceptions I've found.
+ADVERB_ENDINGS = {
+    'e': (frozenset([
+        u'de', u'je', u'ĉe', # prepositions
+        u'he', u've', u'ehe', # exclamations
+        u'ke', u'se', # conjunctions
+        u'ne', # particle, vague category I know, but nothing else fits
+        u'tre', # fixed adverb
+        u'Kabe', # name
+        u'tele-', # again affixes only for completeness
+    ]), None),
+    'en': (frozenset([
+        u'en', u'sen', # prepositions
+        u'jen', # adverb
+        u'sen-', # affix
+        u'Eden', # name
+        u'amen', # exclamation
+    ]), None),
+}
+
+PARTS_OF_SPEECH = [(VERB, VERB_ENDINGS), (ADJECTIVE, ADJECTIVE_ENDINGS),
+                   (NOUN, NOUN_ENDINGS), (ADVERB, ADVERB_ENDINGS)]
+
+def _compile_endings(parts_of_speech):
+    """Merge the ending tables into one dict mapping the last letter of
+    each ending to a list of (order, part of speech, ending, exceptions,
+    members) tuples, so classifying a word is a single lookup.
+
+    """
+    rules = {}
+    for (order, (part_of_speech, endings)) in enumerate(parts_of_speech):
+        for (ending, (exceptions, members)) in endings.items():
+            rules.setdefault(ending[-1], []).append(
+                (order, part_of_speech, ending, exceptions, members))
+
+    for last_letter_rules in rules.values():
+        last_letter_rules.sort()
+    return rules
+
+ENDING_RULES = _compile_endings(PARTS_OF_SPEECH)
+
+ENDING_LENGTHS = range(
+    1, max(len(ending) for (part_of_speech, endings) in PARTS_OF_SPEECH
+           for ending in endings) + 1)
+
+def classify_word(word):
+    """Return a list of (part of speech, stem, ending) tuples, one for
+    every part of speech this word could be, in the order verb,
+    adjective, noun, adverb.
+
+    >>> classify_word(u'kiu')
+    [('adjective', u'ki', 'u')]
+    >>> classify_word(u'hundon')
+    [('noun', u'hund', 'on')]
+
+    """
+    readings = []
+    # An ending can't end with another ending of the same part of
+    # speech, so there's at most one reading for each, and the rules
+    # are already in order.
+    for (order, part_of_speech, ending, exceptions,
+         members) in ENDING_RULES.get(word[-1:], ()):
+        if not word.endswith(ending) or word in exceptions:
+            continue
+        if members is not None and word not in members:
+            continue
+        readings.append((part_of_speech, word[:-len(ending)], ending))
+
+    return readings
+
+def _split(word, endings):
+    """Return (stem, ending) for the first ending in endings (one of the
+    *_ENDINGS tables) that word has, or None.
+
+    """
+    for length in ENDING_LENGTHS:
+        suffix = word[-length:]
+        if suffix not in endings:
+            continue
+
+        (exceptions, members) = endings[suffix]
+        if word in exceptions:
+            return None
+        if members is not None and word not in members:
+            return None
+        # endings are plain ASCII str, callers check for that
+        return (word[:-len(suffix)], str(suffix))
+
+    return None
+
+def split_verb(word):
+    """If this word is a verb, return a tuple of the stem and the
+    ending. Otherwise, return None.
+
+    We consider every tense, but ignore participles (-anta, -ata etc).
+
+    """
+    return _split(word, VERB_ENDINGS)
+
+def split_adjective(word):
+    """If the word is an adjective, return a tuple of the stem and the
+    ending. Otherwise return None.
+
+    """
+    return _split(word, ADJECTIVE_ENDINGS)
+
+def split_noun(word):
+    """Split a word into a tuple of its stem and its ending, if it's a
+    noun. Otherwise return None.
+
+    """
+    return _split(word, NOUN_ENDINGS)
+
+def split_adverb(word):
+    """Split a word into a tuple of its stem and its ending, if it's
+    an adverb. Otherwise return None.
+
+    """
+    return _split(word, ADVERB_ENDINGS)
+
+def is_pronoun(word):
+    return word in PRONOUNS
+
+def is_infinitive(word):
+    split = split_verb(word)
+    return split is not None and split[1] == 'i'
+
+def is_declinable_adjective(word):
+    split = split_adjective(word)
+    return split is not None and split[1] in ('a', 'u')
+
+def is_declinable_noun(word):
+    split = split_noun(word)
+    return split is not None and split[1] == 'o'
+
+def is_declinable_adverb(word):
+    # Be warned: I'm not sure that every adverb makes sense
+    # with -n
+    split = split_adverb(word)
+    return split is not None and split[1] == 'e'
+
+def get_variants(word):
+    """Given a word, return a list of every possible legitimate
+    spelling of it, in every tense and declension. The word itself
+    comes first.
+
+    We generate all our variants in lower case and in Unicode, which
+    gives us a case insensitive search. Searches in other writing
+    systems are converted to Unicode (see vortaro.spelling.get_readings).
+
+    """
+    # the word itself is a variant
+    word = word.lower()
+    variants = [word]
+
+    endings = dict((part_of_speech, ending) for (part_of_speech, stem, ending)
+                   in classify_word(word))
+
+    # every tense and declension
+    if endings.get(VERB) == 'i':
+        root = word[:-1]
+        variants.extend([root + 'is', root + 'as', root + 'os',
+                          root + 'us', root + 'u'])
+    elif endings.get(ADJECTIVE) in ('a', 'u'):
+        variants.extend([word + 'j', word + 'n', word + 'jn'])
+    elif endings.get(NOUN) == 'o':
+        variants.extend([word + 'j', word + 'n', word + 'jn'])
+    elif endings.get(ADVERB) == 'e':
+        variants.extend([word + 'n'])
+    elif is_pronoun(word):
+        variants.extend([word + 'n'])
+
+    return variants
+
+# Endings that get_variants adds, and what they replace.
+INFLECTIONS = [('is', 'i'), ('as', 'i'), ('os', 'i'), ('us', 'i'), ('u', 'i'),
+               ('jn', ''), ('j', ''), ('n', '')]
+
+PARTICIPLE_SUFFIXES = ['ant', 'int', 'ont', 'at', 'it', 'ot']
+
+def get_uninflected_forms(word):
+    """Return every dictionary form (lower case) that word could be an
+    inflection of, including word itself. This is the reverse of
+    get_variants, so we don't need to store every variant. We also
+    recognise participles, which get_variants doesn't generate.
+
+    >>> get_uninflected_forms(u'hundojn')
+    [u'hundojn', u'hundo']
+    >>> get_uninflected_forms(u'vidantaj')
+    [u'vidantaj', u'vidanta', u'vidi']
+
+    """
+    forms = [word]
+
+    readings = classify_word(word)
+
+    # tenses and declensions. classify_word knows words like 'kiu' that
+    # only look like verbs.
+    is_verb = any(part_of_speech == VERB
+                  for (part_of_speech, stem, ending) in readings)
+    for (ending, replacement) in INFLECTIONS:
+        if replacement == 'i' and not is_verb:
+            continue
+        if word.endswith(ending):
+            form = word[:-len(ending)] + replacement
+            if form not in forms and word in get_variants(form):
+                forms.append(form)
+
+    # participles in any declension, e.g. 'manĝantaj' -> 'manĝi'
+    for (part_of_speech, stem, ending) in readings:
+        if part_of_speech == VERB:
+            continue
+        for suffix in PARTICIPLE_SUFFIXES:
+            root = stem[:-len(suffix)]
+            # roots of one letter give nonsense like 'kanto' -> 'ki'
+            if stem.endswith(suffix) and len(root) > 1:
+                form = root + 'i'
+                if form not in forms and is_infinitive(form):
+                    forms.append(form)
+
+    return forms
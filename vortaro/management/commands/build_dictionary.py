@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, DatabaseError
+
+from initialise_database import iter_dictionary, populate_database
+from vortaro.database import (
+    VERSION_FORMAT, allow_writes, get_version_path, switch_database)
+from vortaro.models import Word, Variant, PrimaryDefinition, WordDocument
+
+# Common words that any complete dump will contain.
+SMOKE_WORDS = [u"esti", u"kaj", u"hundo", u"bona"]
+
+# If the new dictionary has fewer than this fraction of the words in
+# the live one, the dump is probably truncated.
+MIN_WORD_RATIO = 0.9
+
+
+class CountingIterator(object):
+    """Wraps an iterable, counting how many items we've taken from it."""
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        item = next(self.iterator)
+        self.count += 1
+        return item
+
+
+def check_database(entry_count, live_word_count, smoke_words=SMOKE_WORDS):
+    """Return a list of problems with the dictionary in the current
+    database, which we've just built from a dump of entry_count
+    entries. An empty list means it's safe to switch to.
+
+    """
+    problems = []
+
+    word_count = Word.objects.count()
+    if word_count != entry_count:
+        problems.append("The dump had %d entries, but we have %d words."
+                        % (entry_count, word_count))
+    if word_count < live_word_count * MIN_WORD_RATIO:
+        problems.append("We have %d words, but the live dictionary has %d."
+                        % (word_count, live_word_count))
+
+    for model in [Variant, PrimaryDefinition, WordDocument]:
+        if not model.objects.exists():
+            problems.append("There are no %s rows." % model.__name__)
+
+    for word in smoke_words:
+        if not Word.objects.find_by_variant(word).exists():
+            problems.append(u"Couldn't find '%s'." % word)
+        elif not WordDocument.objects.filter(word_id=word).exists():
+            problems.append(u"'%s' has no API document." % word)
+
+    return problems
+
+
+def get_word_count():
+    try:
+        return Word.objects.count()
+    except DatabaseError:
+        # no dictionary yet
+        return 0
+
+
+class Command(BaseCommand):
+    help = ("Build a new word_db from a JSON dump next to the live one, "
+            "check it, then switch to it. Running servers pick up the "
+            "new database on their next request.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('dictionary', nargs='?', default='dictionary.json',
+                            help="Path to the JSON dump from ReVo-utilities.")
+        parser.add_argument('--processes', type=int, default=None,
+                            help="How many processes to prepare entries with.")
+        parser.add_argument('--keep', type=int, default=2,
+                            help="How many versions of word_db to keep.")
+        parser.add_argument('--smoke-word', action='append', dest='smoke_words',
+                            help="A word that must be in the new dictionary.")
+
+    def handle(self, *args, **options):
+        smoke_words = [word.decode('utf-8') if isinstance(word, str) else word
+                       for word in options['smoke_words'] or SMOKE_WORDS]
+
+        settings_dict = connection.settings_dict
+        live_path = settings_dict['NAME']
+        live_word_count = get_word_count()
+
+        build_path = get_version_path(live_path, time.strftime(VERSION_FORMAT))
+        if os.path.exists(build_path):
+            raise CommandError("%s already exists." % build_path)
+
+        # Point our connection at the new file while we build it. Only
+        # this process sees the change.
+        connection.close()
+        settings_dict['NAME'] = build_path
+
+        succeeded = False
+        try:
+            allow_writes()
+            call_command('migrate', interactive=False, verbosity=0)
+
+            with io.open(options['dictionary'], encoding='utf-8') as dictionary_file:
+                entries = CountingIterator(iter_dictionary(dictionary_file))
+                populate_database(entries, processes=options['processes'])
+
+            problems = check_database(entries.count, live_word_count, smoke_words)
+            if problems:
+                raise CommandError(u"Not switching to %s:\n%s"
+                                   % (build_path, u"\n".join(problems)))
+            succeeded = True
+        finally:
+            connection.close()
+            settings_dict['NAME'] = live_path
+
+            if not succeeded and os.path.exists(build_path):
+                os.remove(build_path)
+
+        switch_database(live_path, build_path, keep=options['keep'])
+        self.stdout.write("Switched %s to %s" % (live_path, build_path))
@@ -0,0 +1,122 @@
+import hashlib
+import threading
+import urllib
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, quote_etag
+
+from vortaro.database import (
+    get_current_dictionary_version, reopen_if_replaced)
+from vortaro.signals import dictionary_changed
+
+
+class ReopenDatabaseMiddleware(object):
+    """Notice when word_db has been replaced (see
+    vortaro.database.switch_database) and reopen the database
+    connection, so running workers serve the new dictionary without
+    being restarted.
+
+    We only check between requests, so a request in progress finishes
+    with the database it started with.
+
+    """
+    def __init__(self):
+        # Connections are per thread, so each thread tracks the
+        # version it has open.
+        self.seen = threading.local()
+
+    def get_database_path(self):
+        return connection.settings_dict['NAME']
+
+    def process_request(self, request):
+        if reopen_if_replaced(self.seen, self.get_database_path()):
+            dictionary_changed.send(sender=self.__class__)
+
+
+# Views whose responses only depend on the dictionary and the URL.
+DICTIONARY_VIEWS = frozenset([
+    'view_word', 'search_word', 'browse_words',
+    'api_view_word', 'api_search_word', 'api_browse_words',
+    'api_autocomplete',
+])
+
+
+def get_canonical_request(request):
+    """Return the path and query string of request as a byte string,
+    with the parameters sorted so their order doesn't matter.
+
+    """
+    parameters = sorted(
+        (key.encode('utf-8'), value.encode('utf-8'))
+        for (key, values) in request.GET.lists() for value in values)
+    return request.path.encode('utf-8') + '?' + urllib.urlencode(parameters)
+
+
+class DictionaryCacheMiddleware(object):
+    """Let browsers, proxies and API clients cache pages that only
+    depend on the dictionary. The dictionary only changes when we
+    import it again, so a strong ETag of the dictionary version and the
+    request is enough to know whether a cached copy is still good.
+
+    We answer If-None-Match before calling the view, and the
+    dictionary version is cached in each worker, so a 304 costs no
+    queries. We ignore If-Modified-Since, since Last-Modified can't
+    tell a copy from before we changed settings.HTTP_CACHE_VERSION.
+
+    Views can opt out of caching a response by setting Cache-Control
+    themselves.
+
+    """
+    def get_etag(self, request, dictionary_version):
+        # settings.HTTP_CACHE_VERSION changes when we deploy pages
+        # that look different
+        key = "%d:%d:%s" % (settings.HTTP_CACHE_VERSION, dictionary_version,
+                            get_canonical_request(request))
+        return hashlib.sha1(key).hexdigest()
+
+    def add_cache_headers(self, response, etag, dictionary_version):
+        response['ETag'] = quote_etag(etag)
+        # the importer stamps the dictionary with the time (see
+        # vortaro.database.set_dictionary_version)
+        if dictionary_version:
+            response['Last-Modified'] = http_date(dictionary_version)
+        patch_cache_control(response, public=True,
+                            max_age=settings.HTTP_CACHE_MAX_AGE)
+
+    def is_not_modified(self, request, etag):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is None:
+            return False
+
+        etags = parse_etags(if_none_match)
+        return etag in etags or '*' in etags
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if request.resolver_match.url_name not in DICTIONARY_VIEWS:
+            return None
+
+        dictionary_version = get_current_dictionary_version()
+        etag = self.get_etag(request, dictionary_version)
+
+        if self.is_not_modified(request, etag):
+            response = HttpResponseNotModified()
+            self.add_cache_headers(response, etag, dictionary_version)
+            return response
+
+        request.dictionary_cache = (etag, dictionary_version)
+        return None
+
+    def process_response(self, request, response):
+        if not hasattr(request, 'dictionary_cache'):
+            return response
+        if response.status_code != 200 or response.has_header('Cache-Control'):
+            return response
+
+        (etag, dictionary_version) = request.dictionary_cache
+        self.add_cache_headers(response, etag, dictionary_version)
+        return response
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Definition',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('definition', models.TextField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Example',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('example', models.TextField()),
+                ('source', models.TextField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Morpheme',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('morpheme', models.CharField(unique=True, max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Remark',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('remark', models.TextField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Translation',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('translation', models.TextField()),
+                ('language_code', models.CharField(max_length=10)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Variant',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('variant', models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Word',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('word', models.CharField(unique=True, max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PrimaryDefinition',
+            fields=[
+                ('definition_ptr', models.OneToOneField(parent_link=True, auto_created=True, primary_key=True, serialize=False, to='vortaro.Definition')),
+            ],
+            bases=('vortaro.definition',),
+        ),
+        migrations.CreateModel(
+            name='Subdefinition',
+            fields=[
+                ('definition_ptr', models.OneToOneField(parent_link=True, auto_created=True, primary_key=True, serialize=False, to='vortaro.Definition')),
+                ('root_definition', models.ForeignKey(to='vortaro.PrimaryDefinition')),
+            ],
+            bases=('vortaro.definition',),
+        ),
+        migrations.AddField(
+            model_name='variant',
+            name='word',
+            field=models.ForeignKey(to='vortaro.Word'),
+        ),
+        migrations.AddField(
+            model_name='translation',
+            name='definition',
+            field=models.ForeignKey(to='vortaro.Definition'),
+        ),
+        migrations.AddField(
+            model_name='translation',
+            name='word',
+            field=models.ForeignKey(to='vortaro.Word'),
+        ),
+        migrations.AddField(
+            model_name='remark',
+            name='definition',
+            field=models.ForeignKey(to='vortaro.Definition'),
+        ),
+        migrations.AddField(
+            model_name='morpheme',
+            name='primary_word',
+            field=models.ForeignKey(to='vortaro.Word', null=True),
+        ),
+        migrations.AddField(
+            model_name='example',
+            name='definition',
+            field=models.ForeignKey(to='vortaro.Definition'),
+        ),
+        migrations.AddField(
+            model_name='primarydefinition',
+            name='word',
+            field=models.ForeignKey(to='vortaro.Word'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vortaro', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpellingDeletion',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('deletion', models.CharField(max_length=50, db_index=True)),
+                ('variant', models.ForeignKey(to='vortaro.Variant')),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vortaro', '0002_spellingdeletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WordDocument',
+            fields=[
+                ('word', models.OneToOneField(primary_key=True, to_field=b'word', serialize=False, to='vortaro.Word')),
+                ('document', models.TextField()),
+            ],
+        ),
+    ]
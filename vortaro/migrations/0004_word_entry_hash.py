@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vortaro', '0003_worddocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='word',
+            name='entry_hash',
+            field=models.CharField(max_length=40, null=True),
+        ),
+    ]
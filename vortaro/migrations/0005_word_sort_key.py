@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+from vortaro.esperanto_sort import esperanto_sort_key
+
+
+def add_sort_keys(apps, schema_editor):
+    """Give every existing word its sort key. We use the connection
+    we're migrating directly, since it need not be one of
+    settings.DATABASES.
+
+    """
+    cursor = schema_editor.connection.cursor()
+    cursor.execute("SELECT id, word FROM vortaro_word")
+    sort_keys = [(esperanto_sort_key(word), word_id)
+                 for (word_id, word) in cursor.fetchall()]
+
+    cursor.executemany("UPDATE vortaro_word SET sort_key = %s WHERE id = %s",
+                       sort_keys)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vortaro', '0004_word_entry_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='word',
+            name='sort_key',
+            field=models.CharField(max_length=100, db_index=True, default=''),
+            preserve_default=False,
+        ),
+        migrations.RunPython(add_sort_keys, migrations.RunPython.noop),
+    ]
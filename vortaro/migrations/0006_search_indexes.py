@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vortaro', '0005_word_sort_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='variant',
+            name='variant',
+            field=models.CharField(max_length=50, db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='translation',
+            index_together=set([('translation', 'language_code')]),
+        ),
+    ]
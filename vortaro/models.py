@@ -1,36 +1,223 @@
 # -*- coding: utf-8 -*-
+import heapq
+from itertools import groupby
+
 from django.db import models
+from django.db.models import Case, Min, Value, When
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+
+from database import configure_connection
+from esperanto_sort import esperanto_sort_key
+from inflection import get_variants, get_uninflected_forms
+from signals import dictionary_changed
+from spelling import (
+    get_deletions, edit_distance, get_readings, get_prefix_readings)
+from trie import PackedTrie
+
+
+connection_created.connect(configure_connection)
+
+# How much of the edit distance table find_similar may fill in, so a
+# search stays fast however many words are nearby. Each trie node we
+# visit costs a cell for every letter of the search term. 100,000
+# cells take about 0.1s (measured with no branches pruned), well
+# within the deadline of the 'similar' stage (settings.SEARCH_TIMEOUTS).
+MAX_SIMILAR_CELLS = 100000
+
+# The most words find_similar returns.
+MAX_SIMILAR_MATCHES = 100
+
+# How many words we list at a time when browsing the dictionary.
+BROWSE_PAGE_SIZE = 100
+
+# How many words we suggest for a prefix.
+AUTOCOMPLETE_COUNT = 10
 
-from spelling import get_spelling_variations
 
+class WordQuerySet(models.QuerySet):
+    def order_by_esperanto(self):
+        """Sort these words in Esperanto alphabetical order. The
+        database does the sorting, using the collation from
+        database.configure_connection.
 
-class WordManager(models.Manager):
+        """
+        return self.extra(
+            select={'esperanto_order': '"%s"."word" COLLATE esperanto'
+                    % self.model._meta.db_table},
+            order_by=['esperanto_order'])
+
+
+class WordManager(models.Manager.from_queryset(WordQuerySet)):
     def find_by_variant(self, text):
-        """Find every possible term this word could be. Our variant table
-        holds every possible conjugation and declension.
+        """Find every possible term this word could be. We try every
+        Unicode reading of text (see get_readings), and work back from
+        conjugations and declensions to the dictionary form (see
+        get_uninflected_forms).
 
         E.g. 'hundoj' -> we return the word 'hundo'.
 
-        """
-        # This can return multiple words in principle, in practice it
-        # only seems to occur when we have two words that only differ by case.
-        return Word.objects.filter(variant__variant=text)
+        The words are ranked by how directly text spells them: text
+        itself or its inflections first, then the verbs text could be a
+        participle of, so 'spirito' finds 'spirito' before 'spiri'.
+        Ties are in alphabetical order.
 
-    def find_by_variant_fuzzy(self, text):
+        """
+        forms = []
+        participle_forms = []
+        for reading in get_readings(text):
+            for form in get_uninflected_forms(reading):
+                if form == reading or reading in get_variants(form):
+                    forms.append(form)
+                else:
+                    participle_forms.append(form)
+
+        ranks = {}
+        for form in forms + participle_forms:
+            ranks.setdefault(form, len(ranks))
+
+        if len(ranks) == 1:
+            return Word.objects.filter(
+                variant__variant=forms[0]).order_by('sort_key')
+
+        # A word's rank is that of its best form. Since we annotate
+        # after filtering, Min only sees the variants that matched.
+        rank = Min(Case(
+            *[When(variant__variant=form, then=Value(form_rank))
+              for (form, form_rank) in ranks.items()],
+            output_field=models.IntegerField()))
+        return Word.objects.filter(
+            variant__variant__in=list(ranks)
+        ).annotate(rank=rank).order_by('rank', 'sort_key')
+
+    def find_by_variant_fuzzy(self, text, max_distance=1):
         """Find every possible term that this word could be, tolerating
-        spelling errors.
+        up to max_distance spelling errors. See SpellingDeletion.
 
         E.g. 'hundjo' -> we return the word 'hundo' and 'hundejo'.
 
         """
-        spelling_variations = get_spelling_variations(text)
+        readings = get_readings(text)
+
+        deletions = set()
+        for reading in readings:
+            deletions.update(get_deletions(reading, max_distance))
+
+        candidates = Variant.objects.filter(
+            spellingdeletion__deletion__in=deletions
+        ).values_list('word_id', 'variant').distinct()
 
-        # SQLite can't handle more than 999 strings in an IN
-        # query. This occurs for words of more than 12 characters.
-        if len(spelling_variations) > 999:
-            spelling_variations = spelling_variations[:999]
+        word_ids = set(
+            word_id for (word_id, variant) in candidates
+            if any(edit_distance(reading, inflection) <= max_distance
+                   for inflection in get_variants(variant)
+                   for reading in readings))
 
-        return Word.objects.filter(variant__variant__in=spelling_variations)
+        return Word.objects.filter(id__in=word_ids)
+
+    def find_similar(self, text, max_distance=2, max_cells=MAX_SIMILAR_CELLS,
+                     max_matches=MAX_SIMILAR_MATCHES):
+        """Find the words with a variant within max_distance spelling
+        errors of text, by walking an in-memory trie of variants. We
+        give up after filling in max_cells of the edit distance table
+        (shared between every reading of text), so this is suitable for
+        larger distances than find_by_variant_fuzzy.
+
+        Returns a tuple (matches, truncated), where matches is a list
+        of at most max_matches (Word, distance) tuples, nearest first.
+        truncated is True if we gave up or left matches out.
+
+        """
+        readings = get_readings(text)
+
+        distances = {}
+        truncated = False
+        for reading in readings:
+            # each node we visit fills in a row of the table
+            max_steps = max_cells // (len(readings) * (len(reading) + 1))
+            (variant_matches, reading_truncated) = get_variant_trie().search(
+                reading, max_distance, max_steps)
+            truncated = truncated or reading_truncated
+
+            for (variant, word_ids, distance) in variant_matches:
+                for word_id in word_ids:
+                    distances[word_id] = min(
+                        distance, distances.get(word_id, distance))
+
+        # Rank with the in-memory headwords, so we only fetch the words
+        # we return. A short term can be near a large part of the
+        # dictionary, which would be too many IDs for one query.
+        headwords = get_headwords()
+        nearest = sorted(
+            distances.items(),
+            key=lambda (word_id, distance):
+                (distance, esperanto_sort_key(headwords[word_id])))
+        if len(nearest) > max_matches:
+            nearest = nearest[:max_matches]
+            truncated = True
+
+        words = Word.objects.in_bulk([word_id for (word_id, distance) in nearest])
+        matches = [(words[word_id], distance) for (word_id, distance) in nearest]
+
+        return (matches, truncated)
+
+    def autocomplete(self, prefix, count=AUTOCOMPLETE_COUNT):
+        """Return up to count words (as strings) that have a variant
+        starting with prefix, which may be in any writing system (see
+        get_prefix_readings). Words with shorter matching variants
+        come first, then we sort alphabetically.
+
+        This only uses in-memory data, so doesn't hit the database.
+
+        """
+        headwords = get_headwords()
+        trie = get_variant_trie()
+
+        # every variant starting with any reading, shortest first
+        variants = heapq.merge(*[
+            ((len(variant), variant, word_ids)
+             for (variant, word_ids) in trie.items_by_length(reading))
+            for reading in get_prefix_readings(prefix)])
+        variants = ((variant, word_ids) for (length, variant, word_ids) in variants)
+
+        words = []
+        seen_word_ids = set()
+        for (length, length_variants) in groupby(
+                variants, key=lambda variant: len(variant[0])):
+            length_words = []
+            for (variant, word_ids) in length_variants:
+                for word_id in word_ids:
+                    if word_id not in seen_word_ids:
+                        seen_word_ids.add(word_id)
+                        length_words.append(headwords[word_id])
+
+            words.extend(sorted(length_words, key=esperanto_sort_key))
+            if len(words) >= count:
+                break
+
+        return words[:count]
+
+    def browse(self, start=u'', end=None, count=BROWSE_PAGE_SIZE):
+        """List words in Esperanto alphabetical order, starting with
+        start (or the first word after it) and stopping before end, by
+        scanning the index on sort_key.
+
+        Returns a tuple (words, next_word), where words is a list of at
+        most count Words, and next_word is the start of the next page,
+        or None if there are no more words.
+
+        """
+        words = self.filter(sort_key__gte=esperanto_sort_key(start))
+        if end:
+            words = words.filter(sort_key__lt=esperanto_sort_key(end))
+
+        words = list(words.order_by('sort_key')[:count + 1])
+
+        next_word = None
+        if len(words) > count:
+            next_word = words.pop().word
+
+        return (words, next_word)
 
 
 class Word(models.Model):
@@ -44,9 +231,44 @@ class Word(models.Model):
 
     word = models.CharField(max_length=50, unique=True)
 
+    # A hash of the word's entry in the dump we imported it from, so
+    # we only need to reimport entries that have changed.
+    entry_hash = models.CharField(max_length=40, null=True)
+
+    # esperanto_sort_key(word), so we can list words in alphabetical
+    # order from an index, without sorting them.
+    sort_key = models.CharField(max_length=100, db_index=True)
+
     def __unicode__(self):
         return self.word
 
+    def save(self, *args, **kwargs):
+        self.sort_key = esperanto_sort_key(self.word)
+        super(Word, self).save(*args, **kwargs)
+
+    def as_json(self):
+        return {
+            'vorto': self.word,
+            'difinoj': [definition.as_json() for definition
+                        in PrimaryDefinition.objects.for_word(self)],
+        }
+
+
+class WordDocument(models.Model):
+    """The JSON we serve from the API for a word, serialised when the
+    dictionary is imported. The dictionary only changes on reimport,
+    so we don't need to rebuild it on every request.
+
+    This is keyed by the word string, so the API only needs a single
+    primary key lookup.
+
+    """
+    word = models.OneToOneField(Word, to_field='word', primary_key=True)
+    document = models.TextField()
+
+    def __unicode__(self):
+        return self.word_id
+
 class Definition(models.Model):
     """A definition can either belong to a word (a PrimaryDefinition)
     or to another definition (a Subdefinition). Examples can be
@@ -65,6 +287,20 @@ class Definition(models.Model):
         }
 
 
+class PrimaryDefinitionManager(models.Manager):
+    def for_word(self, word):
+        """Return the definitions of this word, in the order ReVo gives
+        them. Their examples, remarks, subdefinitions and translations
+        are all fetched up front, so the whole tree costs a fixed
+        number of queries however many senses the word has.
+
+        """
+        return self.filter(word=word).prefetch_related(
+            'example_set', 'remark_set', 'translation_set',
+            'subdefinition_set__example_set',
+            'subdefinition_set__translation_set')
+
+
 class PrimaryDefinition(Definition):
     """A definition for a word. One word can have many primary
     definitions. The definition text may be null in a few rare
@@ -72,6 +308,8 @@ class PrimaryDefinition(Definition):
     any "" definitions.
 
     """
+    objects = PrimaryDefinitionManager()
+
     word = models.ForeignKey(Word)
 
     def as_json(self):
@@ -119,32 +357,99 @@ class Remark(models.Model):
     remark = models.TextField()
 
 class Variant(models.Model):
-    """A way of writing a term from the dictionary. Nouns may have
-    plural or case endings, verbs can be in any tense and so on. We
-    also allow the word to be in Unicode, h-system or
-    x-system. Finally, a variant is always lower case -- this gives
-    a case-insensitive search of the dictionary.
+    """The lower case dictionary form of a term, which gives a
+    case-insensitive search of the dictionary.
 
-    We run the spellchecker against the list of variants as the
-    user may have entered the word in any tense, capitalisation or
-    writing system.
+    We don't store conjugations and declensions. Searches work back
+    from the inflected form instead (see
+    inflection.get_uninflected_forms), and the spellchecker expands
+    each variant with inflection.get_variants.
 
     An example:
 
-    The variants of the word "aĉeti" will have include "aĉeti",
-    "aĉetas", "aĉetu", "aĉetanta", "acxetis", "achetata" and so on.
+    The word "Aĉeti" has the variant "aĉeti", which matches searches
+    for "aĉetis", "aĉetu" and so on. We only store Unicode spellings:
+    searches in the x-system or h-system ("acxetas", "achetas") are
+    converted first (see spelling.get_readings).
 
     """
     word = models.ForeignKey(Word)
-    variant = models.CharField(max_length=50)
+    variant = models.CharField(max_length=50, db_index=True)
 
     def __unicode__(self):
         return self.variant
 
+# Every Variant, held in memory for find_similar and autocomplete.
+# Maps the variant string to a list of Word IDs. Loaded on first use,
+# once per process.
+_variant_trie = None
+
+def get_variant_trie():
+    global _variant_trie
+    if _variant_trie is None:
+        word_ids_by_inflection = {}
+        for (variant, word_id) in Variant.objects.values_list(
+                'variant', 'word_id').iterator():
+            # we only store the dictionary form, but people type
+            # every inflection
+            for inflection in get_variants(variant):
+                word_ids = word_ids_by_inflection.setdefault(inflection, [])
+                if word_id not in word_ids:
+                    word_ids.append(word_id)
+        _variant_trie = PackedTrie(word_ids_by_inflection)
+
+    return _variant_trie
+
+def clear_variant_trie(**kwargs):
+    global _variant_trie
+    _variant_trie = None
+
+post_save.connect(clear_variant_trie, sender=Variant)
+post_delete.connect(clear_variant_trie, sender=Variant)
+dictionary_changed.connect(clear_variant_trie)
+
+# Word ID to word. Loaded on first use, once per process.
+_headwords = None
+
+def get_headwords():
+    global _headwords
+    if _headwords is None:
+        _headwords = dict(Word.objects.values_list('id', 'word').iterator())
+
+    return _headwords
+
+def clear_headwords(**kwargs):
+    global _headwords
+    _headwords = None
+
+post_save.connect(clear_headwords, sender=Word)
+post_delete.connect(clear_headwords, sender=Word)
+dictionary_changed.connect(clear_headwords)
+
+class SpellingDeletion(models.Model):
+    """A string made by deleting letters from a Variant or one of its
+    inflections, for spell checking. If a user's search term shares a
+    deletion with a variant, the variant is a candidate for what they
+    meant.
+
+    An example:
+
+    The variant "hundo" has the deletions "hundo", "undo", "hndo",
+    "hudo", "huno", "hund", "ndo", "udo", "hundoj", "undoj" and so on.
+
+    """
+    variant = models.ForeignKey(Variant)
+    deletion = models.CharField(max_length=50, db_index=True)
+
+    def __unicode__(self):
+        return self.deletion
+
 class Morpheme(models.Model):
     """A potential component of a word that has been put together. We
-    generate morphemes in all three major writing systems, and also
-    allow words ending -o or -a to be used wholesale.
+    store morphemes in Unicode only, since parse_morphology converts
+    the search term from the x-system or h-system (see
+    spelling.get_readings). We also allow words ending -o or -a to be
+    used wholesale.
 
     Since -ant, -int, -ont and -unt aren't in ReVo, we add them
     manually with a null primary_word. No other Morphemes should be
@@ -155,15 +460,13 @@ class Morpheme(models.Model):
     sumo, haplo, nova, togo, vila, koto, metro, polo, alo --
     because they could be <word> or <word>o
 
-    Sauda Arabujo/Saŭda Arabujo and Sauda-Arabujo/Saŭda-Arabujo --
-    because in the h-system we don't know which of the pair to pick.
-
     For example, in the word 'plifortigi' the morphemes would be
     'pli', 'fort' and 'ig'.
 
     Examples:
 
-    "aĉeti" (verb) will have morphemes "aĉet", "acxet" and "achet"
+    "aĉeti" (verb) will have the morpheme "aĉet" (searches for
+    "acxeti" or "acheti" find it too)
 
     "per" (preposition) will have the morpheme "per"
 
@@ -181,6 +484,84 @@ class Morpheme(models.Model):
             return u"%s (no primary word)" % (self.morpheme,)
 
 
+# The Esperanto name of each language, by language code.
+LANGUAGE_NAMES = {
+    'ab': u'La abĥaza', 'af': u'La afrikansa',
+    'am': u'La amhara', 'ar': u'La araba',
+    'as': u'La asama', 'ay': u'La ajmara',
+    'az': u'La azerbajĝana', 'ba': u'La baŝkira',
+    'be': u'La belorusa', 'bg': u'La bulgara',
+    'bh': u'La bihara', 'bi': u'La bislama',
+    'bn': u'La bengala', 'bo': u'La tibeta',
+    'br': u'La bretona', 'ca': u'La kataluna',
+    'co': u'La korsika', 'cs': u'La ĉeĥa',
+    'cy': u'La kimra', 'da': u'La dana',
+    'de': u'La germana', 'dz': u'La dzonka',
+    'el': u'La greka', 'en': u'La angla',
+    'eo': u'Esperanto', 'es': u'La hispana',
+    'et': u'La estona', 'eu': u'La eŭska',
+    'fa': u'La persa', 'fi': u'La finna',
+    'fj': u'La fiĝia', 'fo': u'La feroa',
+    'fr': u'La franca', 'fy': u'La okcidentfrisa',
+    'ga': u'La irlanda', 'gd': u'La skotgaela',
+    'gl': u'La galega', 'gn': u'La gvarania',
+    'goyu': u'La tajvana', 'grc': u'La malnovgreka',
+    'gu': u'La guĝarata', 'ha': u'La haŭsa',
+    'he': u'La hebrea', 'hi': u'La hinda',
+    'hr': u'La kroata', 'hu': u'La hungara',
+    'hy': u'La armena', 'ia': u'Interlingvao',
+    'id': u'La indonezia', 'ie': u'Okcidentalo',
+    'ik': u'La inupiaka', 'io': u'Ido',
+    'is': u'La islanda', 'it': u'La itala',
+    'iu': u'La inuktituta', 'ja': u'La japana',
+    'jbo': u'Loĵbano', 'jw': u'La java',
+    'ka': u'La kartvela', 'kek': u'La kekĉia',
+    'kk': u'La kazaĥa', 'kl': u'La gronlanda',
+    'km': u'La kmera', 'kn': u'La kanara',
+    'ko': u'La korea', 'ks': u'La kaŝmira',
+    'ku': u'La kurda', 'ky': u'La kirgiza',
+    'la': u'Latineca nomo', 'lat': u'Latino',
+    'ln': u'La lingala', 'lo': u'La laŭa',
+    'lt': u'La litova', 'lv': u'La latva',
+    'mg': u'La malagasa', 'mi': u'La maoria',
+    'mk': u'La makedona', 'ml': u'La malajalama',
+    'mn': u'La mongola', 'mo': u'La moldava',
+    'mr': u'La marata', 'ms': u'La malaja',
+    'mt': u'La malta', 'my': u'La birma',
+    'na': u'La naura', 'ne': u'La nepala',
+    'nl': u'La nederlanda', 'no': u'La norvega',
+    'oc': u'La okcitana', 'om': u'La oroma',
+    'or': u'La odia', 'os': u'La oseta',
+    'pa': u'La panĝaba', 'pl': u'La pola',
+    'ps': u'La paŝtua', 'pt': u'La portugala',
+    'qu': u'La keĉua', 'rm': u'La romanĉa',
+    'rn': u'La burunda', 'ro': u'La rumana',
+    'ru': u'La rusa', 'rw': u'La ruanda',
+    'sa': u'Sanskrito', 'sd': u'La sinda',
+    'se': u'La nordsamea', 'sg': u'La sangoa',
+    'sh': u'La serbokroata', 'si': u'La sinhala',
+    'sk': u'La slovaka', 'sl': u'La slovena',
+    'sm': u'La samoa', 'sn': u'La ŝona',
+    'so': u'La somala', 'sq': u'La albana',
+    'sr': u'La serba', 'ss': u'La svazia',
+    'st': u'La sota', 'su': u'La sunda',
+    'sv': u'La sveda', 'sw': u'La svahila',
+    'ta': u'La tamila', 'te': u'La telugua',
+    'tg': u'La taĝika', 'th': u'La taja',
+    'ti': u'La tigraja', 'tk': u'La turkmena',
+    'tl': u'La filipina', 'tn': u'La cvana',
+    'to': u'La tongaa', 'tp': u'Tokipono',
+    'tr': u'La turka', 'ts': u'La conga',
+    'tt': u'La tatara', 'tw': u'La akana',
+    'ug': u'La ujgura', 'uk': u'La ukraina',
+    'ur': u'Urduo', 'uz': u'La uzbeka',
+    'vi': u'La vjetnama', 'vo': u'Volapuko',
+    'wo': u'La volofa', 'xh': u'La kosa',
+    'yi': u'La jida', 'yo': u'La joruba',
+    'za': u'La ĝuanga', 'zh': u'La ĉina',
+    'zu': u'La zulua'}
+
+
 class Translation(models.Model):
     """The matching word for this definition of this word in another
     language.
@@ -193,6 +574,11 @@ class Translation(models.Model):
     translation = models.TextField()
     language_code = models.CharField(max_length=10)
 
+    class Meta:
+        # Searches look up translations by their text, so this index
+        # serves them as well as searches limited to one language.
+        index_together = [('translation', 'language_code')]
+
     def as_json(self):
         return {
             'lingvo': self.language,
@@ -202,83 +588,7 @@ class Translation(models.Model):
 
     @property
     def language(self):
-        language_map = {
-            'ab': u'La abĥaza', 'af': u'La afrikansa',
-            'am': u'La amhara', 'ar': u'La araba',
-            'as': u'La asama', 'ay': u'La ajmara',
-            'az': u'La azerbajĝana', 'ba': u'La baŝkira',
-            'be': u'La belorusa', 'bg': u'La bulgara',
-            'bh': u'La bihara', 'bi': u'La bislama',
-            'bn': u'La bengala', 'bo': u'La tibeta',
-            'br': u'La bretona', 'ca': u'La kataluna',
-            'co': u'La korsika', 'cs': u'La ĉeĥa',
-            'cy': u'La kimra', 'da': u'La dana',
-            'de': u'La germana', 'dz': u'La dzonka',
-            'el': u'La greka', 'en': u'La angla',
-            'eo': u'Esperanto', 'es': u'La hispana',
-            'et': u'La estona', 'eu': u'La eŭska',
-            'fa': u'La persa', 'fi': u'La finna',
-            'fj': u'La fiĝia', 'fo': u'La feroa',
-            'fr': u'La franca', 'fy': u'La okcidentfrisa',
-            'ga': u'La irlanda', 'gd': u'La skotgaela',
-            'gl': u'La galega', 'gn': u'La gvarania',
-            'goyu': u'La tajvana', 'grc': u'La malnovgreka',
-            'gu': u'La guĝarata', 'ha': u'La haŭsa',
-            'he': u'La hebrea', 'hi': u'La hinda',
-            'hr': u'La kroata', 'hu': u'La hungara',
-            'hy': u'La armena', 'ia': u'Interlingvao',
-            'id': u'La indonezia', 'ie': u'Okcidentalo',
-            'ik': u'La inupiaka', 'io': u'Ido',
-            'is': u'La islanda', 'it': u'La itala',
-            'iu': u'La inuktituta', 'ja': u'La japana',
-            'jbo': u'Loĵbano', 'jw': u'La java',
-            'ka': u'La kartvela', 'kek': u'La kekĉia',
-            'kk': u'La kazaĥa', 'kl': u'La gronlanda',
-            'km': u'La kmera', 'kn': u'La kanara',
-            'ko': u'La korea', 'ks': u'La kaŝmira',
-            'ku': u'La kurda', 'ky': u'La kirgiza',
-            'la': u'Latineca nomo', 'lat': u'Latino',
-            'ln': u'La lingala', 'lo': u'La laŭa',
-            'lt': u'La litova', 'lv': u'La latva',
-            'mg': u'La malagasa', 'mi': u'La maoria',
-            'mk': u'La makedona', 'ml': u'La malajalama',
-            'mn': u'La mongola', 'mo': u'La moldava',
-            'mr': u'La marata', 'ms': u'La malaja',
-            'mt': u'La malta', 'my': u'La birma',
-            'na': u'La naura', 'ne': u'La nepala',
-            'nl': u'La nederlanda', 'no': u'La norvega',
-            'oc': u'La okcitana', 'om': u'La oroma',
-            'or': u'La odia', 'os': u'La oseta',
-            'pa': u'La panĝaba', 'pl': u'La pola',
-            'ps': u'La paŝtua', 'pt': u'La portugala',
-            'qu': u'La keĉua', 'rm': u'La romanĉa',
-            'rn': u'La burunda', 'ro': u'La rumana',
-            'ru': u'La rusa', 'rw': u'La ruanda',
-            'sa': u'Sanskrito', 'sd': u'La sinda',
-            'se': u'La nordsamea', 'sg': u'La sangoa',
-            'sh': u'La serbokroata', 'si': u'La sinhala',
-            'sk': u'La slovaka', 'sl': u'La slovena',
-            'sm': u'La samoa', 'sn': u'La ŝona',
-            'so': u'La somala', 'sq': u'La albana',
-            'sr': u'La serba', 'ss': u'La svazia',
-            'st': u'La sota', 'su': u'La sunda',
-            'sv': u'La sveda', 'sw': u'La svahila',
-            'ta': u'La tamila', 'te': u'La telugua',
-            'tg': u'La taĝika', 'th': u'La taja',
-            'ti': u'La tigraja', 'tk': u'La turkmena',
-            'tl': u'La filipina', 'tn': u'La cvana',
-            'to': u'La tongaa', 'tp': u'Tokipono',
-            'tr': u'La turka', 'ts': u'La conga',
-            'tt': u'La tatara', 'tw': u'La akana',
-            'ug': u'La ujgura', 'uk': u'La ukraina',
-            'ur': u'Urduo', 'uz': u'La uzbeka',
-            'vi': u'La vjetnama', 'vo': u'Volapuko',
-            'wo': u'La volofa', 'xh': u'La kosa',
-            'yi': u'La jida', 'yo': u'La joruba',
-            'za': u'La ĝuanga', 'zh': u'La ĉina',
-            'zu': u'La zulua'}
-
-        return language_map[self.language_code]
+        return LANGUAGE_NAMES[self.language_code]
 
     def __unicode__(self):
         return "%s: %s" % (self.language, self.translation)
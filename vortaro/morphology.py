@@ -1,6 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import heapq
+from itertools import islice
+
+from django.db.models.signals import post_save, post_delete
+
+from inflection import classify_word
 from models import Morpheme
+from signals import dictionary_changed
+from spelling import get_readings
+from trie import Trie
 
 """Esperanto morphology tools. We have methods for identifying word
 type, for stemming and for parsing combined words.
@@ -9,253 +18,27 @@ A major use of this code is for generating every possible form of a
 word -- we want to produce "bluaj" from "blua" but not "laj" from "la"
 and so on.
 
-For the split_* methods, these have been cross checked using the
-following commands to find exceptions (singular nouns in this
-example):
-
-fish> egrep -iw '^.*o$' <word_list.txt | awk '{ print length(), $0 | "sort -n" }' | less
+Recognising word endings (classify_word, split_*, is_*) is in
+inflection.py.
 
 """
 
-def split_verb(word):
-    """If this word is a verb, return a tuple of the stem and the
-    ending. Otherwise, return None.
+# Well known affixes are more likely, so a parse using them is
+# preferred. Which ones specifically to include chosen by trial and
+# error.
+COMMON_AFFIXES = frozenset([
+    'ig', 'il', 'ul', 'ej', 'in', 'an', 'ar', 'ant', 'int', 'ont', 'at',
+    'it', 'ot', 'al', 'em'])
 
-    We consider every tense, but ignore participles (-anta, -ata etc).
-
-    """
-    # infinitives
-    if word.endswith('i'):
-        # *i words that are not verbs:
-        pronouns = [u'ci', u'ĝi', u'ili', u'li', u'mi', u'ni', u'oni', u'ri', u'si', u'ŝi', u'vi']
-        adverbs = [u'ĉi']
-        exclamations = [u'ahi', u'fi']
-        abbreviations = [u'ĥi'] # same as ĥio actually
-        affix = [u'-ologi']
-        preposition = [u'pli']
-
-        if word in (pronouns + adverbs + exclamations + abbreviations +
-                    affix + preposition):
-            return None
-        else:
-            return (word[:-1], 'i')
-
-    if word.endswith('is'):
-        exclamation = ['bis']
-        prefix = ['mis']
-        preposition = [u'ĝis']
-        names = [u'Ĝenĝis', u'Ĝinĝis']
-
-        if word in (exclamation + prefix + preposition + names):
-            return None
-        else:
-            return (word[:-2], 'is')
-
-    if word.endswith('as'):
-        # no exceptions as far as I'm aware
-        return (word[:-2], 'as')
-
-    if word.endswith('os'):
-        # also no exceptions it seems
-        return (word[:-2], 'os')
-
-    if word.endswith('us'):
-        adverb = [u'ĵus']
-        conjunctions = ['plus', 'minus']
-        if word in (adverb + conjunctions):
-            return None
-        else:
-            return (word[:-2], 'us')
-
-    if word.endswith('u'):
-        table_words = ['kiu', u'ĉiu', 'tiu', 'neniu', 'iu']
-        numbers = ['unu', 'du']
-        onomatopoeia = ['fu']
-        interjections = ['hu', 'nu']
-        adverbs = ['ju', 'plu']
-        conjunction = [u'ĉu']
-        if word in (table_words + numbers + onomatopoeia +
-                    interjections + adverbs + conjunction):
-            return None
-        else:
-            return (word[:-1], 'u')
-
-    return None
-
-def split_adjective(word):
-    """If the word is an adjective, return a tuple of the stem and the
-    ending. Otherwise return None.
-
-    """
-    if word.endswith('a'):
-        onomatopoeia = ['ta'] # to be precise, it's "ta ta ta"
-        exclamations = ['hura', 'pa', 'aha', 'ba', 'ha']
-        prepositions = ['tra', 'la', 'ja']
-        if word in (onomatopoeia + exclamations + prepositions):
-            return None
-        else:
-            return (word[:-1], 'a')
-
-    if word.endswith('aj'):
-        exclamation = ['aj']
-        conjunction = ['kaj']
-        if word in (exclamation + conjunction):
-            return None
-        else:
-            return (word[:-2], 'aj')
-
-    if word.endswith('an'):
-        names = ['Osman', 'Jordan']
-        if word in names:
-            return None
-        else:
-            return (word[:-2], 'an')
-
-    if word.endswith('ajn'):
-        if word == 'ajn':
-            return None
-        else:
-            return (word[:-3], 'ajn')
-
-    # table words ending -u act as adjectives
-    if word.endswith('u'):
-        table_words = ['kiu', u'ĉiu', 'tiu', 'neniu', 'iu']
-        if word in table_words:
-            return (word[:-1], 'u')
-        else:
-            return None
-
-    if word.endswith('uj'):
-        # arguably 'neniuj' doesn't exist, but for the sake of completeness
-        table_words = ['kiuj', u'ĉiuj', 'tiuj', 'neniuj', 'iuj']
-        if word in table_words:
-            return (word[:-2], 'uj')
-        else:
-            return None
-
-    if word.endswith('un'):
-        table_words = ['kiun', u'ĉiun', 'tiun', 'neniun', 'iun']
-        if word in table_words:
-            return (word[:-2], 'un')
-        else:
-            return None
-
-    if word.endswith('ujn'):
-        # also arguably 'neniujn' doesn't exist
-        table_words = ['kiujn', u'ĉiujn', 'tiujn', 'neniujn', 'iujn']
-        if word in table_words:
-            return (word[:-3], 'ujn')
-        else:
-            return None
-
-    return None
-
-def split_noun(word):
-    """Split a word into a tuple of its stem and its ending, if it's a
-    noun. Otherwise return None.
-
-    """
-    if word.endswith('o'):
-        exclamation = ['ho']
-        # we list the prefices for completeness
-        # although they arguably end '-'
-        affixes = ['-o', 'bo-', 'geo-']
-        conjunction = ['do']
-        preposition = ['po']
-        if word in [exclamation + affixes + conjunction + preposition]:
-            return None
-        else:
-            return (word[:-1], 'o')
-
-    if word.endswith('oj'):
-        if word == 'oj': # exclamation
-            return None
-        else:
-            return (word[:-2], 'oj')
-
-    if word.endswith('on'):
-        if word == 'Simeon': # name
-            return None
-        else:
-            return (word[:-2], 'on')
-
-    if word.endswith('ojn'):
-        # appears there are no exceptions
-        return (word[:-3], 'ojn')
-
-    return None
-
-def split_adverb(word):
-    """Split a word into a tuple of its stem and its ending, if it's
-    an adjective. Otherwise return None.
-
-    I'm not convinced every adverb actually makes sense with an -en
-    ending, but we deal with all the exceptions I've found.
+def morpheme_badness(morpheme):
+    """How much this Morpheme adds to the badness of a parse. Every
+    morpheme costs something, since fewer, longer morphemes is more
+    likely.
 
     """
-    if word.endswith('e'):
-        preposition = ['de', 'je', u'ĉe']
-        exclamation = ['he', 've', 'ehe']
-        conjunctions = ['ke', 'se']
-        particle = ['ne'] # vague category I know, but nothing else fits
-        fixed_adverbs = ['tre']
-        name = ['Kabe']
-        affix = ['tele-'] # again affixes only for completeness
-        if word in (preposition + exclamation + conjunctions +
-                    particle + fixed_adverbs + name + affix):
-            return None
-        else:
-            return (word[:-1], 'e')
-
-    if word.endswith('en'):
-        prepositions = ['en', 'sen']
-        adverb = ['jen']
-        affix = ['sen-']
-        name = ['Eden']
-        exclamation = ['amen']
-        if word in (prepositions + adverb + affix + name + exclamation):
-            return None
-        else:
-            return (word[:-2], 'en')
-
-    return None
-
-def is_pronoun(word):
-    return word in ['ci', 'ĝi', 'ili', 'li', 'mi', 'ni', 'oni', 'ri', 'si', 'ŝi', 'vi']
-
-def is_infinitive(word):
-    if split_verb(word):
-        (stem, ending) = split_verb(word)
-        if ending == 'i':
-            return True
-
-    return False
-
-def is_declinable_adjective(word):
-    if split_adjective(word):
-        (stem, ending) = split_adjective(word)
-        if ending == 'a' or ending == 'u' or ending == 'i':
-            return True
-
-    return False
-
-def is_declinable_noun(word):
-    if split_noun(word):
-        (stem, ending) = split_noun(word)
-        if ending == 'o':
-            return True
-
-    return False
-
-def is_declinable_adverb(word):
-    # Be warned: I'm not sure that every adverb makes sense
-    # with -n
-    if split_adverb(word):
-        (stem, ending) = split_adverb(word)
-        if ending == 'e':
-            return True
-
-    return False
+    if morpheme.morpheme in COMMON_AFFIXES:
+        return 0.5
+    return 1
 
 def score_parse(parse):
     """Given a parse (a list of Morphemes plus optional string
@@ -265,26 +48,50 @@ def score_parse(parse):
 
     """
     # ignore string endings from stemmer
-    if type(parse[-1]) == str:
+    if parse and type(parse[-1]) == str:
         parse = parse[:-1]
 
-    # fewer, longer morphemes is more likely
-    badness = len(parse)
+    return sum(morpheme_badness(morpheme) for morpheme in parse)
 
-    # well known affixes are more likely
-    # (which ones specifically to include chosen by trial and error)
-    for affix in ['ig', 'il', 'ul', 'ej', 'in', 'an', 'ar', 'ant',
-                  'int', 'ont', 'at', 'it', 'ot', 'al', 'em']:
-        for morpheme in parse:
-            if morpheme.morpheme == affix:
-                badness -= 0.5
+# How much work we're prepared to do looking for parses of a single
+# word, so a long search term can't tie up the server. See iter_roots.
+MAX_PARSE_STEPS = 1000
 
-    return badness
+class ParseBudgetExceeded(Exception):
+    pass
 
-def parse_morphology(word):
+class Parses(list):
+    """A list of parses, which also records whether we stopped looking
+    before we had found all the parses we were asked for.
+
+    """
+    truncated = False
+
+def parse_morphology(word, k=2, max_steps=MAX_PARSE_STEPS):
+    """Return the k most likely parses of word, which may be written in
+    any writing system. If we use more than max_steps looking for the
+    parses of one reading of word, give up and return what we have so
+    far, marked as truncated.
+
+    """
     # potential parses are weighted by likelihood, only show top two
     # since the rest are probably nonsensical
-    return parse_morphology_all(word)[:2]
+    readings = get_readings(word)
+
+    parses = Parses()
+    for reading in readings:
+        try:
+            for parse in islice(iter_parses(reading, max_steps), k):
+                parses.append(parse)
+        except ParseBudgetExceeded:
+            parses.truncated = True
+
+    if len(readings) > 1:
+        # the best parses of any reading
+        parses.sort(key=score_parse)
+        del parses[k:]
+
+    return parses
 
 
 def parse_morphology_all(word):
@@ -295,60 +102,60 @@ def parse_morphology_all(word):
     We return a list of Morpheme objects followed (optionally) by a
     string of the ending.
 
+    """
+    return list(iter_parses(word))
+
+
+def iter_parses(word, max_steps=None):
+    """Lazily yield the parses of parse_morphology_all, most likely
+    first. word must be in Unicode, since that's all we store (see
+    get_readings). See iter_roots for max_steps.
+
     """
     assert isinstance(word, basestring)
 
     # for table words, just get them as-is
-    if word in [u'ĉio', 'cxio', 'chio', 'nenio', 'tio', 'io', 'kio',
-                u'ĉiu', 'cxiu', 'chiu', 'neniu', 'tiu', 'iu', 'kiu',
-                u'ĉie', 'cxie', 'chie', 'nenie', 'tie', 'ie', 'kie',
-                u'ĉia', 'cxia', 'chia', 'nenia', 'tia', 'ia', 'kia']:
-        return [[find_matching(word)]]
+    if word in [u'ĉio', 'nenio', 'tio', 'io', 'kio',
+                u'ĉiu', 'neniu', 'tiu', 'iu', 'kiu',
+                u'ĉie', 'nenie', 'tie', 'ie', 'kie',
+                u'ĉia', 'nenia', 'tia', 'ia', 'kia']:
+        morpheme = find_matching(word)
+        if morpheme:
+            yield [morpheme]
+        return
 
     # for table words with -j or -n endings, print 'nenio-n' instead of 'neni-on'
-    if word in [u'ĉion', 'cxion', 'chion', 'nenion', 'tion', 'ion', 'kion',
-                u'ĉiun', 'cxiun', 'chiun', 'neniun', 'tiun', 'iun', 'kiun',
-                u'ĉien', 'cxien', 'chien', 'nenien', 'tien', 'ien', 'kien',
-                u'ĉian', 'cxian', 'chian', 'nenian', 'tian', 'ian', 'kian']:
-        return [[find_matching(word[:-1]), 'n']]
-
-    if split_verb(word):
-        (stem, ending) = split_verb(word)
-        parses = find_roots(stem)
-        return [parse + [ending] for parse in parses]
-
-    if split_adjective(word):
-        (stem, ending) = split_adjective(word)
-        parses = find_roots(stem)
-        return [parse + [ending] for parse in parses]
-
-    if split_noun(word):
-        (stem, ending) = split_noun(word)
-        parses = find_roots(stem)
-        return [parse + [ending] for parse in parses]
-
-    if split_adverb(word):
-        (stem, ending) = split_adverb(word)
-        parses = find_roots(stem)
-        return [parse + [ending] for parse in parses]
+    if word in [u'ĉion', 'nenion', 'tion', 'ion', 'kion',
+                u'ĉiun', 'neniun', 'tiun', 'iun', 'kiun',
+                u'ĉien', 'nenien', 'tien', 'ien', 'kien',
+                u'ĉian', 'nenian', 'tian', 'ian', 'kian']:
+        morpheme = find_matching(word[:-1])
+        if morpheme:
+            yield [morpheme, 'n']
+        return
+
+    readings = classify_word(word)
+    if readings:
+        (part_of_speech, stem, ending) = readings[0]
+        for parse in iter_roots(stem, max_steps):
+            yield parse + [ending]
+        return
 
     # doesn't appear to have an ending we can get rid of
-    return find_roots(word)
+    for parse in iter_roots(word, max_steps):
+        yield parse
 
 def find_roots(compound):
     """Given a word that has been put together using Esperanto roots,
-    find those roots. We do this by working left to right and building
-    up a list of all possible radikoj according to the substrings seen
-    so far.
+    find those roots. We return every possible list of radikoj, most
+    likely first.
 
     Since we assume roots are intact, the suffices -ĉjo and -njo which
     modify the roots cannot be used with this approach.
 
     For a given string, there are 2^(n-1) possible ways to split it
-    into substrings so this algorithm is potentially
-    exponential. However, since we work left to right and don't
-    examine the remainder if a prefix isn't valid, the performance
-    isn't much worse than linear.
+    into substrings, so returning all of them is potentially
+    exponential. Use iter_roots if you only want the best few.
 
     Examples worth thinking about: senvestigi, persone (is a pun and
     has two parses), birdkanto, birdokanto, sobrakape (seen in the
@@ -363,40 +170,118 @@ def find_roots(compound):
     [['person', 'e'], ['per', 'son', 'e']]
 
     """
+    return list(iter_roots(compound))
 
-    if compound == "":
-        return [[]]
+def build_lattice(compound):
+    """Return a list holding, for every offset into compound, a list
+    of (length, Morpheme) tuples for the morphemes starting there.
+
+    """
+    trie = get_morpheme_trie()
+    return [list(trie.prefixes(compound[offset:]))
+            for offset in range(len(compound))]
 
-    splits = []
-    for i in range(1, len(compound) + 1):
-        match = find_matching(compound[0:i])
-        if not match is None:
-            # this seems to be a valid word or root
-            # so see if the remainder is valid
-            endings = find_roots(compound[i:])
-            # todo: ending is not an ideal variable name
-            for ending in endings:
-                splits.append([match] + ending)
+def iter_roots(compound, max_steps=None):
+    """Lazily yield the parses of find_roots, in the same order.
 
-    # if there are multiple parses, try to make the first one the most
-    # likely possibility
-    splits.sort(key=score_parse)
+    We build the lattice of morphemes once, then work backwards from
+    the end of the word to find the cheapest way of finishing a parse
+    from every offset. Offsets that can't reach the end are never
+    explored. This gives an exact estimate for a best-first search,
+    so every parse popped off the queue is the next best one, and we
+    only do as much work as the caller consumes.
 
-    return splits
+    Parses with equal scores are ordered by the lengths of their
+    morphemes, shortest first, just as splitting left to right would
+    give.
+
+    If max_steps is given, we raise ParseBudgetExceeded once we have
+    taken that many partial parses off the queue.
+
+    """
+    lattice = build_lattice(compound)
+    end = len(compound)
+
+    # the lowest badness needed to parse compound[offset:], or None if
+    # it can't be parsed
+    remaining = [None] * end + [0]
+    for offset in reversed(range(end)):
+        for (length, morpheme) in lattice[offset]:
+            rest = remaining[offset + length]
+            if rest is not None:
+                badness = morpheme_badness(morpheme) + rest
+                if remaining[offset] is None or badness < remaining[offset]:
+                    remaining[offset] = badness
+
+    if remaining[0] is None:
+        return
+
+    # (estimated badness, morpheme lengths, offset, badness so far, morphemes)
+    queue = [(remaining[0], (), 0, 0, ())]
+    steps = 0
+    while queue:
+        steps += 1
+        if max_steps is not None and steps > max_steps:
+            raise ParseBudgetExceeded()
+
+        (_, lengths, offset, badness, morphemes) = heapq.heappop(queue)
+        if offset == end:
+            yield list(morphemes)
+            continue
+
+        for (length, morpheme) in lattice[offset]:
+            rest = remaining[offset + length]
+            if rest is not None:
+                new_badness = badness + morpheme_badness(morpheme)
+                heapq.heappush(queue, (new_badness + rest,
+                                       lengths + (length,),
+                                       offset + length,
+                                       new_badness,
+                                       morphemes + (morpheme,)))
 
 def find_matching(word):
     """See if this word is a valid morpheme in the database. If so,
     return it."""
     # note we will need to consider both full words and roots
     # e.g. 'dormoĉambro' -> 'dormo' 'ĉambr' (after stemming)
+    return get_morpheme_trie().get(word)
+
+
+# Every Morpheme, held in memory so parsing a word doesn't need a
+# query for every substring. Loaded on first use, once per process.
+_morpheme_trie = None
+
+def get_morpheme_trie():
+    """Return a Trie mapping every morpheme string to its Morpheme
+    object. The primary word is fetched too, so callers can link to it
+    without touching the database.
+
+    """
+    global _morpheme_trie
+    if _morpheme_trie is None:
+        trie = Trie()
+        for morpheme in Morpheme.objects.select_related('primary_word'):
+            trie.add(morpheme.morpheme, morpheme)
+        _morpheme_trie = trie
+
+    return _morpheme_trie
+
+def clear_morpheme_trie(**kwargs):
+    """Discard the in-memory morphemes, so they're reloaded from the
+    database next time we parse a word.
+
+    """
+    global _morpheme_trie
+    _morpheme_trie = None
+
+post_save.connect(clear_morpheme_trie, sender=Morpheme)
+post_delete.connect(clear_morpheme_trie, sender=Morpheme)
+dictionary_changed.connect(clear_morpheme_trie)
 
-    matches = Morpheme.objects.filter(morpheme=word)
-    assert len(matches) < 2
-    if len(matches) == 1:
-        return matches[0]
-    else:
-        return None
 
+# Search terms longer than this are cut short, since no word is that
+# long and they only make work for us.
+MAX_SEARCH_TERM_LENGTH = 40
 
 def canonicalise_word(word):
     """Given a word, convert it to a canonical form that matches how we
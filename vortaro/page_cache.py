@@ -0,0 +1,75 @@
+"""A cache of rendered word and search pages. Rendering a word page
+takes several queries and a reverse() for every morpheme, but the
+result only changes when we import the dictionary.
+
+If settings.PAGE_CACHE_BACKEND names one of Django's CACHES, we keep
+pages there. A locmem cache keeps them in each worker, and a
+filesystem cache shares them between the workers on a machine. The
+backend's MAX_ENTRIES bounds how many pages we keep, and it evicts
+pages when it's full.
+
+Pages are keyed by the dictionary version (see
+database.get_dictionary_version), so we never serve pages of a
+dictionary we've since replaced.
+
+"""
+from functools import wraps
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from database import get_current_dictionary_version
+
+
+def get_page_key(dictionary_version, view_name, key):
+    # hashed, since memcached keys can't contain spaces or be too long
+    return "page:%d:%d:%s:%s" % (
+        settings.HTTP_CACHE_VERSION, dictionary_version, view_name,
+        hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+def cache_page_by_dictionary(get_key):
+    """Decorate a view so we serve its pages from the page cache when
+    we can, without calling the view at all.
+
+    get_key is called with the same arguments as the view, and
+    returns a unicode string that identifies the page, or None if this
+    request shouldn't use the cache. Equivalent requests should give
+    the same key.
+
+    We only keep successful responses, and not those the view has set
+    Cache-Control on (e.g. incomplete searches).
+
+    """
+    def decorator(view):
+        @wraps(view)
+        def cached_view(request, *args, **kwargs):
+            if not settings.PAGE_CACHE_BACKEND or request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            key = get_key(request, *args, **kwargs)
+            if key is None:
+                return view(request, *args, **kwargs)
+
+            cache = caches[settings.PAGE_CACHE_BACKEND]
+            page_key = get_page_key(get_current_dictionary_version(),
+                                    view.__name__, key)
+
+            page = cache.get(page_key)
+            if page is not None:
+                (content, content_type) = page
+                return HttpResponse(content, content_type=content_type)
+
+            response = view(request, *args, **kwargs)
+            if (response.status_code == 200 and not response.streaming
+                    and not response.has_header('Cache-Control')):
+                cache.set(page_key,
+                          (response.content, response['Content-Type']))
+
+            return response
+
+        return cached_view
+
+    return decorator
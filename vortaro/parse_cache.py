@@ -0,0 +1,189 @@
+"""A cache of parse_morphology results for search terms. Popular
+searches come up again and again, and there's no need to parse them
+every time.
+
+Each worker holds the most recently used parses in memory. If
+settings.PARSE_CACHE_BACKEND names one of Django's CACHES, workers
+also share parses through it.
+
+Entries are keyed by the version the importer stamped on the
+dictionary (see database.get_dictionary_version), so we never serve
+parses of a dictionary we've since replaced.
+
+"""
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete
+
+from database import get_current_dictionary_version
+from models import Morpheme
+from morphology import Parses, get_morpheme_trie, parse_morphology
+from signals import dictionary_changed
+
+
+class LRUCache(object):
+    """A dict holding at most max_size items, discarding the least
+    recently used item when it's full. It's safe to share between
+    threads, and counts how often we found what we looked for.
+
+    >>> cache = LRUCache(2)
+    >>> cache.set('a', 1)
+    >>> cache.set('b', 2)
+    >>> cache.get('a')
+    1
+    >>> cache.set('c', 3)
+    >>> cache.get('b') is None
+    True
+
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key):
+        """Return the value stored under key, or None."""
+        with self.lock:
+            value = self.items.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+
+            # most recently used items are at the end
+            self.items[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+def serialize_parses(parses):
+    """Convert the result of parse_morphology to plain data, so it
+    can be stored outside this process. Morphemes are stored as their
+    strings, and endings are kept separately.
+
+    """
+    serialized = []
+    for parse in parses:
+        ending = None
+        if parse and isinstance(parse[-1], str):
+            ending = parse[-1]
+            parse = parse[:-1]
+
+        # table words that aren't in the dictionary give None
+        morphemes = [morpheme and morpheme.morpheme for morpheme in parse]
+        serialized.append((morphemes, ending))
+
+    return (parses.truncated, serialized)
+
+
+def deserialize_parses(serialized):
+    """The reverse of serialize_parses, using the in-memory morphemes
+    so we don't need any queries.
+
+    """
+    (truncated, serialized_parses) = serialized
+    trie = get_morpheme_trie()
+
+    parses = Parses()
+    parses.truncated = truncated
+    for (morphemes, ending) in serialized_parses:
+        parse = [morpheme and trie.get(morpheme) for morpheme in morphemes]
+        if ending is not None:
+            parse.append(ending)
+        parses.append(parse)
+
+    return parses
+
+
+_parses = LRUCache(settings.PARSE_CACHE_SIZE)
+
+# Parses we found in the shared cache, rather than this worker's.
+_shared_hits = 0
+
+
+def get_shared_key(dictionary_version, search_term):
+    # hashed, since memcached keys can't contain spaces or be too long
+    return "parses:%d:%s" % (
+        dictionary_version,
+        hashlib.sha1(search_term.encode('utf-8')).hexdigest())
+
+
+def cached_parse_morphology(search_term):
+    """Return parse_morphology(search_term), from the cache if we've
+    parsed it before. search_term should already be canonical (see
+    canonicalise_word), so equivalent searches share an entry.
+
+    """
+    global _shared_hits
+    dictionary_version = get_current_dictionary_version()
+
+    key = (dictionary_version, search_term)
+    serialized = _parses.get(key)
+    if serialized is not None:
+        return deserialize_parses(serialized)
+
+    shared_cache = None
+    if settings.PARSE_CACHE_BACKEND:
+        shared_cache = caches[settings.PARSE_CACHE_BACKEND]
+        shared_key = get_shared_key(dictionary_version, search_term)
+        serialized = shared_cache.get(shared_key)
+
+        if serialized is not None:
+            _shared_hits += 1
+            _parses.set(key, serialized)
+            return deserialize_parses(serialized)
+
+    parses = parse_morphology(search_term)
+    serialized = serialize_parses(parses)
+
+    _parses.set(key, serialized)
+    if shared_cache is not None:
+        shared_cache.set(shared_key, serialized)
+
+    return parses
+
+
+def get_statistics():
+    """Return the counters for this worker's cache as a dict. Misses
+    in this worker's cache that we found in the shared cache count as
+    shared hits.
+
+    """
+    return {
+        'pid': os.getpid(),
+        'dictionary_version': get_current_dictionary_version(),
+        'size': len(_parses),
+        'max_size': _parses.max_size,
+        'hits': _parses.hits,
+        'shared_hits': _shared_hits,
+        'misses': _parses.misses - _shared_hits,
+    }
+
+
+def clear_parse_cache(**kwargs):
+    """Forget the parses in this worker."""
+    _parses.clear()
+
+post_save.connect(clear_parse_cache, sender=Morpheme)
+post_delete.connect(clear_parse_cache, sender=Morpheme)
+dictionary_changed.connect(clear_parse_cache)
@@ -0,0 +1,327 @@
+"""Running the stages of a search (exact matches, similar words, word
+parses and translations) at the same time. They don't depend on each
+other, so a search can take as long as its slowest stage rather than
+all of them added together.
+
+Each stage has a deadline (settings.SEARCH_TIMEOUTS). If a stage
+misses it, we answer without it and mark it as incomplete, rather than
+keeping the user waiting. The stage finishes in the background.
+
+Stages run on a pool of settings.SEARCH_THREADS threads in each
+worker. With no threads, they run one after another in the request
+thread and always complete.
+
+A stage that misses its deadline is abandoned. If it hasn't started,
+it never does. Its queries are interrupted at the deadline (see
+past_deadline), and the rest of its work is bounded (see
+MAX_SIMILAR_CELLS and MAX_PARSE_STEPS), so it doesn't keep its thread
+for long. Until it's done, though, the thread is busy. If abandoned
+stages fill every thread, new searches answer at once without their
+stages, rather than queueing behind them or starting more threads.
+
+Identical searches at the same time share one set of stages, see
+coalesce.py.
+
+"""
+from collections import Counter
+import hashlib
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import OperationalError, close_old_connections
+from django.db.backends.signals import connection_created
+
+from coalesce import SingleFlight, shared_single_flight
+from database import get_current_dictionary_version, reopen_if_replaced
+from models import Word, Translation
+from morphology import Parses
+from parse_cache import cached_parse_morphology
+
+
+class SearchResults(object):
+    """Everything we found for a search term. incomplete holds the
+    names of the stages that didn't finish in time, which leave their
+    attributes empty.
+
+    """
+    def __init__(self, matching_words, similar_words, similar_truncated,
+                 parses, translations, incomplete):
+        self.matching_words = matching_words
+        self.similar_words = similar_words
+        self.similar_truncated = similar_truncated
+        self.parses = parses
+        self.translations = translations
+        self.incomplete = incomplete
+
+
+def find_exact(search_term):
+    return list(Word.objects.find_by_variant(search_term))
+
+
+def find_similar(search_term, max_distance):
+    """Return a tuple (words, truncated) of words that are a few
+    spelling mistakes away from search_term. Users can ask us to
+    tolerate more mistakes, but we then limit how long we spend
+    looking.
+
+    """
+    if max_distance > 1:
+        # already ranked by distance
+        (similar, truncated) = Word.objects.find_similar(
+            search_term, max_distance)
+        return ([word for (word, distance) in similar], truncated)
+
+    similar = Word.objects.find_by_variant_fuzzy(search_term)
+    return (list(similar.order_by_esperanto()), False)
+
+
+def find_translations(search_term):
+    """Return the translations that match search_term exactly, in
+    any language.
+
+    """
+    return list(Translation.objects.filter(
+        translation=search_term).select_related('word'))
+
+
+# Searches in progress in this worker.
+_searches = SingleFlight()
+
+def search(search_term, max_distance=1):
+    """Run every stage of a search for search_term, which should
+    already be canonical (see canonicalise_word), and return a
+    SearchResults. Coalesced searches share one SearchResults, so
+    callers mustn't modify it.
+
+    If the same search is already running in this worker, we wait for
+    it instead (but no longer than the search should take). If
+    settings.SEARCH_COALESCE_BACKEND names one of CACHES, we also wait
+    for the same search in other workers.
+
+    """
+    dictionary_version = get_current_dictionary_version()
+    return _searches.call(
+        (dictionary_version, search_term, max_distance), get_search_timeout(),
+        search_workers, dictionary_version, search_term, max_distance)
+
+
+def get_search_timeout():
+    """Return the most seconds a search should take: the deadline of
+    its slowest stage. Stages without threads always finish, so we
+    then allow as long as we'd wait for another worker.
+
+    """
+    if settings.SEARCH_THREADS:
+        return max(settings.SEARCH_TIMEOUTS.values())
+    return settings.SEARCH_COALESCE_TIMEOUT
+
+
+def search_workers(dictionary_version, search_term, max_distance):
+    if not settings.SEARCH_COALESCE_BACKEND:
+        return run_search(search_term, max_distance)
+
+    # hashed, since memcached keys can't contain spaces or be too long
+    key = "search:%d:%d:%s" % (
+        dictionary_version, max_distance,
+        hashlib.sha1(search_term.encode('utf-8')).hexdigest())
+    return shared_single_flight(
+        caches[settings.SEARCH_COALESCE_BACKEND], key,
+        settings.SEARCH_COALESCE_TIMEOUT, is_complete,
+        run_search, search_term, max_distance)
+
+
+def is_complete(results):
+    """Whether every stage of the search finished in time, so other
+    workers can reuse the results. Results that were truncated by
+    MAX_SIMILAR_CELLS or MAX_PARSE_STEPS are complete, since the same
+    search would stop in the same place again.
+
+    """
+    return not results.incomplete
+
+
+def run_search(search_term, max_distance):
+    """Do the work of search, without coalescing."""
+    # (name, function, arguments, result if it doesn't finish)
+    incomplete_parses = Parses()
+    incomplete_parses.truncated = True
+    stages = [
+        ('exact', find_exact, (search_term,), []),
+        ('similar', find_similar, (search_term, max_distance), ([], True)),
+        ('parses', cached_parse_morphology, (search_term,),
+         incomplete_parses),
+        ('translations', find_translations, (search_term,), []),
+    ]
+    (results, incomplete) = run_stages(stages)
+
+    # We looked for similar words without waiting for the exact
+    # matches, so leave them out now.
+    (similar_words, similar_truncated) = results['similar']
+    similar_words = [word for word in similar_words
+                     if word not in results['exact']]
+
+    return SearchResults(
+        results['exact'], similar_words, similar_truncated,
+        results['parses'], results['translations'], incomplete)
+
+
+def run_stages(stages):
+    """Call every function in stages, a list of tuples (name,
+    function, arguments, default). Return a tuple (results,
+    incomplete), where results maps each name to what its function
+    returned, or to default if it missed its deadline, and incomplete
+    is the set of names that missed their deadlines.
+
+    """
+    thread_count = settings.SEARCH_THREADS
+    if not thread_count:
+        results = dict((name, function(*arguments))
+                       for (name, function, arguments, default) in stages)
+        return (results, set())
+
+    start = time.time()
+    with _pools_lock:
+        if _overdue[thread_count] >= thread_count:
+            # every thread is busy with abandoned stages
+            results = dict((name, default)
+                           for (name, function, arguments, default) in stages)
+            return (results, set(results))
+
+        pool = get_pool(thread_count)
+
+    pending = []
+    for (name, function, arguments, default) in stages:
+        # every deadline counts from when we started, not from when
+        # the previous stage finished
+        stage = Stage(function, arguments,
+                      start + settings.SEARCH_TIMEOUTS[name], thread_count)
+        pending.append((name, stage, pool.apply_async(run_stage, (stage,)),
+                        default))
+
+    results = {}
+    incomplete = set()
+    for (name, stage, async_result, default) in pending:
+        try:
+            results[name] = async_result.get(
+                max(stage.deadline - time.time(), 0))
+        except (TimeoutError, StageInterrupted):
+            results[name] = default
+            incomplete.add(name)
+            abandon_stage(stage)
+
+    return (results, incomplete)
+
+
+class StageInterrupted(Exception):
+    """A stage reached its deadline before it could finish."""
+
+
+class Stage(object):
+    """A call to function(*arguments) that we've given to the pool of
+    thread_count threads, to finish by deadline (a time.time()).
+    started, finished and abandoned are guarded by _pools_lock.
+
+    """
+    def __init__(self, function, arguments, deadline, thread_count):
+        self.function = function
+        self.arguments = arguments
+        self.deadline = deadline
+        self.thread_count = thread_count
+        self.started = False
+        self.finished = False
+        self.abandoned = False
+
+
+def abandon_stage(stage):
+    """Record that we've stopped waiting for stage. If it's running,
+    it counts against its pool until it finishes.
+
+    """
+    with _pools_lock:
+        if not stage.finished:
+            stage.abandoned = True
+            if stage.started:
+                _overdue[stage.thread_count] += 1
+
+
+# The database version each pool thread last saw, see
+# reopen_if_replaced.
+_seen = threading.local()
+
+def run_stage(stage):
+    """Call the stage's function in a pool thread, unless we've
+    already given up on it. Pool threads aren't part of any request,
+    so we tidy up their connections ourselves, just as Django does for
+    request threads.
+
+    """
+    with _pools_lock:
+        if stage.abandoned or time.time() >= stage.deadline:
+            stage.finished = True
+            raise StageInterrupted()
+        stage.started = True
+
+    reopen_if_replaced(_seen)
+    _deadlines.deadline = stage.deadline
+    try:
+        return stage.function(*stage.arguments)
+    except OperationalError:
+        if past_deadline():
+            raise StageInterrupted()
+        raise
+    finally:
+        _deadlines.deadline = None
+        close_old_connections()
+
+        with _pools_lock:
+            stage.finished = True
+            if stage.abandoned:
+                _overdue[stage.thread_count] -= 1
+
+
+# How many SQLite virtual machine instructions we run between checks
+# of the stage's deadline.
+DEADLINE_CHECK_INTERVAL = 10000
+
+# The deadline of the stage running in this thread, if any.
+_deadlines = threading.local()
+
+def past_deadline():
+    """Return True if this thread is running a stage that has missed
+    its deadline. SQLite calls this as a progress handler, and
+    interrupts the query if it returns True.
+
+    """
+    deadline = getattr(_deadlines, 'deadline', None)
+    return deadline is not None and time.time() >= deadline
+
+
+def interrupt_at_deadline(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        connection.connection.set_progress_handler(
+            past_deadline, DEADLINE_CHECK_INTERVAL)
+
+connection_created.connect(interrupt_at_deadline)
+
+
+# Thread pools for this process, by size. We create them on first use,
+# so workers forked from a parent that imported this module get their
+# own threads.
+_pools = {}
+_pools_lock = threading.Lock()
+
+# How many stages each pool is still running after we abandoned them.
+_overdue = Counter()
+
+def get_pool(thread_count):
+    """Return the pool of thread_count threads. Call this with
+    _pools_lock held.
+
+    """
+    if thread_count not in _pools:
+        _pools[thread_count] = ThreadPool(thread_count)
+    return _pools[thread_count]
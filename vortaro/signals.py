@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent when the dictionary has been changed in bulk (e.g. by an import,
+# or by switching to a new word_db) rather than by saving models, so
+# anything holding a copy of it in memory knows to reload it.
+dictionary_changed = Signal()
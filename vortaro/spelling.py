@@ -82,3 +82,177 @@ def get_spelling_variations(word):
     variations.append('-' + word)
 
     return variations
+
+# Rather than generating every misspelling of the search term, we
+# also precompute a symmetric delete index (as used by SymSpell). For
+# every variant we store each string made by deleting up to
+# MAX_DISTANCE letters. Two strings within MAX_DISTANCE edits of each
+# other always share one of these deletions, so a lookup only needs
+# the deletions of the search term, which is a much shorter list.
+#
+# Only the first PREFIX_LENGTH letters are used, which keeps the index
+# small and is still enough to find every candidate. Candidates are
+# then checked against the whole string with edit_distance.
+MAX_DISTANCE = 2
+PREFIX_LENGTH = 7
+
+def parse_max_distance(value):
+    """Given the number of spelling mistakes a user asked us to
+    tolerate (a string, or None if they didn't say), return a distance
+    between 1 and MAX_DISTANCE.
+
+    """
+    try:
+        distance = int(value)
+    except (TypeError, ValueError):
+        return 1
+
+    return max(1, min(distance, MAX_DISTANCE))
+
+def get_deletions(word, max_distance=MAX_DISTANCE):
+    """Return the set of strings we can make by deleting up to
+    max_distance letters from the start of this word (including the
+    start itself).
+
+    >>> sorted(get_deletions('hundo', 1))
+    ['hndo', 'hudo', 'hund', 'hundo', 'huno', 'undo']
+
+    """
+    word = word[:PREFIX_LENGTH]
+
+    deletions = set([word])
+    previous = set([word])
+    for distance in range(max_distance):
+        previous = set(delete_letter(deletion, i)
+                       for deletion in previous
+                       for i in range(len(deletion)))
+        deletions.update(previous)
+
+    return deletions
+
+def edit_distance(x, y):
+    """Return the number of insertions, deletions, replacements and
+    transpositions of adjacent letters needed to turn x into y (the
+    'optimal string alignment' distance).
+
+    This matches the mistakes that get_spelling_variations considers.
+
+    """
+    # distances[i][j] is the distance between x[:i] and y[:j]
+    distances = [[0] * (len(y) + 1) for i in range(len(x) + 1)]
+    for i in range(len(x) + 1):
+        distances[i][0] = i
+    for j in range(len(y) + 1):
+        distances[0][j] = j
+
+    for i in range(1, len(x) + 1):
+        for j in range(1, len(y) + 1):
+            replace_cost = 0 if x[i-1] == y[j-1] else 1
+            distances[i][j] = min(distances[i-1][j] + 1,
+                                  distances[i][j-1] + 1,
+                                  distances[i-1][j-1] + replace_cost)
+
+            if (i > 1 and j > 1 and x[i-1] == y[j-2] and
+                x[i-2] == y[j-1]):
+                distances[i][j] = min(distances[i][j],
+                                      distances[i-2][j-2] + 1)
+
+    return distances[len(x)][len(y)]
+
+# We only store Unicode spellings, so users searching in the x-system
+# or the h-system have their search term converted first. x isn't an
+# Esperanto letter, so the x-system is unambiguous.
+X_SYSTEM = {u'cx': u'ĉ', u'gx': u'ĝ', u'hx': u'ĥ', u'jx': u'ĵ', u'sx': u'ŝ',
+            u'ux': u'ŭ'}
+
+# The h-system is ambiguous: 'ch' may be 'ĉ' or a 'c' followed by an
+# 'h' (e.g. 'dishaki' is dis-haki), and ŭ is written as a plain 'u'. We
+# only consider ŭ after a vowel, as in 'aŭ' and 'eŭ', since it doesn't
+# occur anywhere else in practice.
+H_SYSTEM = {u'ch': u'ĉ', u'gh': u'ĝ', u'hh': u'ĥ', u'jh': u'ĵ', u'sh': u'ŝ',
+            u'au': u'aŭ', u'eu': u'eŭ'}
+
+# Letters that may be the first half of an x-system or h-system
+# letter, when the user hasn't typed the second half yet.
+HATTED_LETTERS = {u'c': u'ĉ', u'g': u'ĝ', u'h': u'ĥ', u'j': u'ĵ', u's': u'ŝ',
+                  u'u': u'ŭ'}
+
+# The most readings of an h-system word we consider, so a word with
+# many ambiguous letters doesn't make us search for all 2^n of them.
+MAX_READINGS = 8
+
+def from_x_system(word):
+    """Convert x-system letters in this (lower case) word to Unicode.
+
+    >>> from_x_system(u'mangxi')
+    u'man\\u011di'
+
+    """
+    for (x_letter, letter) in X_SYSTEM.items():
+        word = word.replace(x_letter, letter)
+    return word
+
+def _iter_h_readings(word):
+    """Lazily yield every reading of word in the h-system, trying each
+    ambiguous pair as one letter before trying it as two. We loop
+    rather than recurse, so a long word can't exhaust the stack.
+
+    """
+    # (offset in word, reading of word[:offset])
+    stack = [(0, u'')]
+    while stack:
+        (offset, reading) = stack.pop()
+
+        # copy the letters up to the next ambiguous pair
+        end = offset
+        while end < len(word) and word[end:end + 2] not in H_SYSTEM:
+            end += 1
+        reading += word[offset:end]
+
+        if end == len(word):
+            yield reading
+            continue
+
+        # pushed last, so tried first
+        stack.append((end + 1, reading + word[end]))
+        stack.append((end + 2, reading + H_SYSTEM[word[end:end + 2]]))
+
+def get_readings(word):
+    """Return the Unicode words that this (lower case) word could be,
+    allowing for it being in the x-system or the h-system. x-system
+    letters are always converted, since x isn't an Esperanto letter.
+    The reading that treats every ambiguous h-system letter as a
+    digraph comes first, and the reading that treats none of them as
+    one (the word as written, apart from x-system letters) comes last.
+
+    >>> get_readings(u'dishaki')
+    [u'di\\u015daki', u'dishaki']
+
+    """
+    word = from_x_system(word)
+
+    readings = []
+    for reading in _iter_h_readings(word):
+        if len(readings) == MAX_READINGS - 1:
+            break
+        if reading != word:
+            readings.append(reading)
+
+    readings.append(word)
+    return readings
+
+def get_prefix_readings(prefix):
+    """Like get_readings, but for the start of a word. The last letter
+    may be the first half of an x-system or h-system letter (e.g. 's'
+    in 'sx' or 'sh'), so we also try the hatted letter.
+
+    """
+    readings = get_readings(prefix)
+
+    for reading in list(readings):
+        if reading and reading[-1] in HATTED_LETTERS:
+            hatted_reading = reading[:-1] + HATTED_LETTERS[reading[-1]]
+            if hatted_reading not in readings:
+                readings.append(hatted_reading)
+
+    return readings
@@ -1,9 +1,46 @@
 # -*- coding: utf-8 -*-
 from django_test_mixins import HttpCodeTestCase
-from django.test import TestCase
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, connections, DatabaseError
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.migrations.executor import MigrationExecutor
+from django.core.cache import caches
 from django.core.urlresolvers import reverse
+from django.template.loader import render_to_string
 
-from vortaro.models import Word, Translation, Definition, Variant
+import json
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+import copy
+import threading
+import time
+
+from vortaro.models import (
+    Word, Translation, Definition, Variant, Morpheme, PrimaryDefinition,
+    Subdefinition, Example, Remark, WordDocument)
+from vortaro.morphology import Parses, parse_morphology
+from vortaro.inflection import (
+    classify_word, get_uninflected_forms, get_variants, split_adjective,
+    split_adverb, split_noun, split_verb)
+from vortaro.esperanto_sort import esperanto_sort_key, compare_esperanto_strings
+from vortaro.spelling import get_readings, get_prefix_readings, MAX_READINGS
+from initialise_database import (
+    create_spelling_deletions, get_entry_hash, import_dictionary,
+    populate_database, prepare_entry, iter_dictionary, update_database)
+from vortaro.database import (
+    allow_writes, get_dictionary_version, get_version_path, switch_database)
+from vortaro.management.commands.build_dictionary import check_database
+from vortaro.middleware import ReopenDatabaseMiddleware
+from vortaro.coalesce import SingleFlight, shared_single_flight
+from vortaro.search import SearchResults, run_stages, search
+from vortaro.parse_cache import (
+    LRUCache, cached_parse_morphology, clear_parse_cache, get_statistics)
+from vortaro.signals import dictionary_changed
+from vortaro import views
+from vortaro.views import group_translations
 
 
 class IndexTests(TestCase):
@@ -41,6 +78,35 @@ class WordPageTests(HttpCodeTestCase):
         response = self.client.get(reverse('view_word', args=['saluto']))
         self.assertEqual(response.status_code, 200)
 
+    def test_view_renders_definition_tree(self):
+        word = Word.objects.create(word="saluto")
+        for i in range(3):
+            definition = PrimaryDefinition.objects.create(
+                word=word, definition="difino %d" % i)
+            Example.objects.create(definition=definition, example="ekzemplo %d" % i)
+            Remark.objects.create(definition=definition, remark="rimarko %d" % i)
+            Translation.objects.create(word=word, definition=definition,
+                                       translation="greeting", language_code="en")
+            for j in range(2):
+                subdefinition = Subdefinition.objects.create(
+                    root_definition=definition, definition="subdifino %d.%d" % (i, j))
+                Example.objects.create(definition=subdefinition,
+                                       example="subekzemplo %d.%d" % (i, j))
+                Translation.objects.create(word=word, definition=subdefinition,
+                                           translation="salut", language_code="fr")
+
+        # One query for the word, one for its definitions, and one
+        # each for their examples, remarks, translations,
+        # subdefinitions, subdefinition examples and subdefinition
+        # translations.
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('view_word', args=['saluto']))
+
+        self.assertHttpOK(response)
+        self.assertContains(response, "subekzemplo 2.1")
+        self.assertContains(response, "rimarko 1")
+        self.assertContains(response, "salut")
+
     def test_view_redirects_nonexistent_word(self):
         response = self.client.get(reverse('view_word', args=['no_such_word']))
         self.assertHttpRedirect(response)
@@ -93,6 +159,21 @@ class SearchPageTests(HttpCodeTestCase):
         response = self.client.get(reverse('search_word') + '?s=salutoj&rekte=yes')
         self.assertHttpRedirect(response)
 
+    def test_search_i_feel_lucky_prefers_nouns_to_participles(self):
+        # 'spirito' could also be a participle of 'spiri'
+        for text in [u"spiri", u"spirito"]:
+            word = Word.objects.create(word=text)
+            Variant.objects.create(word=word, variant=text)
+
+        self.assertEqual(
+            [word.word for word in Word.objects.find_by_variant(u"spirito")],
+            [u"spirito", u"spiri"])
+
+        response = self.client.get(reverse('search_word'),
+                                   {'s': u"spirito", 'rekte': ''})
+        self.assertRedirects(response,
+                             reverse('view_word', args=[u"spirito"]))
+
     def test_search_renders_translations(self):
         word = Word.objects.create(word="saluto")
         definition = Definition.objects.create(definition="foo")
@@ -101,3 +182,1193 @@ class SearchPageTests(HttpCodeTestCase):
 
         response = self.client.get(reverse('search_word') + '?s=hello')
         self.assertHttpOK(response)
+
+
+class EsperantoSortTests(TestCase):
+    words = [u"-aĉ", u"a b", u"ab", u"abc", u"cu", u"Cu", u"ĉu", u"da",
+             u"zo", u"zé", u"zéa", u"é"]
+
+    def test_sort_key(self):
+        shuffled = list(reversed(self.words))
+        self.assertEqual(sorted(shuffled, key=esperanto_sort_key), self.words)
+        self.assertEqual(sorted(shuffled, cmp=compare_esperanto_strings),
+                         self.words)
+
+    def test_sort_key_bytestrings(self):
+        self.assertEqual(esperanto_sort_key(u"ĉu".encode("utf-8")),
+                         esperanto_sort_key(u" ĉu "))
+
+    def test_order_by_esperanto(self):
+        for word in reversed(self.words):
+            Word.objects.create(word=word)
+
+        self.assertEqual(
+            [word.word for word in Word.objects.order_by_esperanto()],
+            self.words)
+
+
+class WritingSystemTests(TestCase):
+    def test_readings(self):
+        self.assertEqual(get_readings(u"mangxi"), [u"manĝi"])
+        self.assertEqual(get_readings(u"manghi"), [u"manĝi", u"manghi"])
+        self.assertEqual(get_readings(u"ankau"), [u"ankaŭ", u"ankau"])
+        # dis-haki, not di-ŝaki
+        self.assertEqual(get_readings(u"dishaki"), [u"diŝaki", u"dishaki"])
+
+    def test_readings_bounded(self):
+        readings = get_readings(u"sh" * 10)
+        self.assertEqual(len(readings), MAX_READINGS)
+        self.assertEqual(readings[0], u"ŝ" * 10)
+        self.assertEqual(readings[-1], u"sh" * 10)
+
+    def test_readings_long_word(self):
+        # far deeper than the recursion limit
+        readings = get_readings(u"sh" * 2000)
+        self.assertEqual(len(readings), MAX_READINGS)
+
+    def test_prefix_readings(self):
+        self.assertEqual(get_prefix_readings(u"s"), [u"s", u"ŝ"])
+
+    def test_search_any_writing_system(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+        sxati = Word.objects.get(word=u"ŝati")
+
+        self.assertFalse(Variant.objects.filter(variant=u"sxatas").exists())
+        for text in [u"ŝatas", u"sxatas", u"shatas"]:
+            self.assertEqual(list(Word.objects.find_by_variant(text)), [sxati])
+            self.assertEqual(list(Word.objects.find_by_variant_fuzzy(text + u"s")),
+                             [sxati])
+
+            parses = parse_morphology(text)
+            self.assertEqual([parse[0].morpheme for parse in parses], [u"ŝat"])
+
+
+class InflectionTests(TestCase):
+    def test_one_variant_per_word(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+
+        self.assertEqual(Variant.objects.count(), Word.objects.count())
+        self.assertEqual(Variant.objects.get(word__word=u"ŝati").variant, u"ŝati")
+
+    def test_find_inflections(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+        sxati = Word.objects.get(word=u"ŝati")
+
+        for text in [u"ŝatis", u"ŝatu", u"ŝatantaj", u"ŝatitan", u"ŝatonte"]:
+            self.assertEqual(list(Word.objects.find_by_variant(text)), [sxati])
+
+    def test_table_words_are_not_inflected(self):
+        """'kiu' looks like an imperative, but isn't one."""
+        self.assertEqual(get_uninflected_forms(u"kiu"), [u"kiu"])
+        self.assertEqual(get_uninflected_forms(u"kiujn"), [u"kiujn", u"kiu"])
+
+    def test_classify_word(self):
+        for word in [u"hundo", u"ŝatas", u"kiu", u"kiujn", u"bela", u"ajn",
+                     u"ĉi", u"hejmen", u"la", u"do"]:
+            readings = [(stem, ending) for (part_of_speech, stem, ending)
+                        in classify_word(word)]
+            splits = [split(word) for split in
+                      [split_verb, split_adjective, split_noun, split_adverb]]
+            self.assertEqual(readings, [split for split in splits if split])
+
+    def test_noun_exceptions(self):
+        """'do' is a conjunction, not a noun, so there's no 'don'."""
+        self.assertIsNone(split_noun(u"do"))
+        self.assertEqual(get_variants(u"do"), [u"do"])
+
+    def test_fuzzy_search_inflections(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+        hundo = Word.objects.get(word=u"hundo")
+
+        self.assertEqual(list(Word.objects.find_by_variant_fuzzy(u"hudnojn")),
+                         [hundo])
+        (matches, truncated) = Word.objects.find_similar(u"hundjon")
+        self.assertEqual(matches, [(hundo, 1)])
+
+
+class BrowseTests(TestCase):
+    words = [u"ambaŭ", u"bona", u"cent", u"ĉevalo", u"ĉu", u"dento", u"ŝati"]
+
+    def setUp(self):
+        for word in reversed(self.words):
+            Word.objects.create(word=word)
+
+    def test_browse(self):
+        (words, next_word) = Word.objects.browse(count=3)
+        self.assertEqual([word.word for word in words], self.words[:3])
+        self.assertEqual(next_word, u"ĉevalo")
+
+        (words, next_word) = Word.objects.browse(next_word, count=10)
+        self.assertEqual([word.word for word in words], self.words[3:])
+        self.assertIsNone(next_word)
+
+    def test_browse_range(self):
+        (words, next_word) = Word.objects.browse(u"ĉ", u"d")
+        self.assertEqual([word.word for word in words], [u"ĉevalo", u"ĉu"])
+        self.assertIsNone(next_word)
+
+    def test_browse_uses_index(self):
+        words = Word.objects.filter(
+            sort_key__gte=esperanto_sort_key(u"ĉ"),
+            sort_key__lt=esperanto_sort_key(u"d")).order_by("sort_key")
+        (sql, params) = words.query.sql_with_params()
+
+        cursor = connection.cursor()
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        plan = " ".join(row[-1] for row in cursor.fetchall())
+
+        self.assertIn("USING INDEX", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_browse_page(self):
+        response = self.client.get(reverse("browse_words"), {"de": u"ĉ"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([word.word for word in response.context["words"]],
+                         self.words[3:])
+
+
+class MorphologyTests(TestCase):
+    def test_parse_uses_no_queries(self):
+        """Once morphemes are loaded, parsing shouldn't hit the database."""
+        word = Word.objects.create(word="persono")
+        Morpheme.objects.create(primary_word=word, morpheme="person")
+        parse_morphology(u"persone")
+
+        with self.assertNumQueries(0):
+            parses = parse_morphology(u"persone")
+
+        self.assertEqual([part.morpheme for part in parses[0][:-1]], ["person"])
+        self.assertEqual(parses[0][0].primary_word, word)
+
+    def test_new_morphemes_are_found(self):
+        self.assertEqual(parse_morphology(u"hundo"), [])
+
+        word = Word.objects.create(word="hundo")
+        Morpheme.objects.create(primary_word=word, morpheme="hund")
+
+        self.assertEqual(len(parse_morphology(u"hundo")), 1)
+
+    def test_table_words_in_any_writing_system(self):
+        # we used to give [None] as the parse of a missing table word
+        self.assertEqual(parse_morphology(u"chiun"), [])
+
+        Morpheme.objects.create(morpheme=u"ĉiu")
+        parses = parse_morphology(u"chiun")
+        self.assertEqual([part.morpheme for part in parses[0][:-1]], [u"ĉiu"])
+
+    def test_long_compound_with_many_parses(self):
+        """A word with millions of parses should still give us the best two
+        without enumerating them all.
+
+        """
+        for morpheme in ["a", "b", "ab"]:
+            Morpheme.objects.create(morpheme=morpheme)
+
+        parses = parse_morphology(u"ab" * 20)
+
+        self.assertEqual(len(parses), 2)
+        self.assertEqual([part.morpheme for part in parses[0]], ["ab"] * 20)
+        self.assertEqual([part.morpheme for part in parses[1]],
+                         ["a", "b"] + ["ab"] * 19)
+
+    def test_parse_gives_up_after_max_steps(self):
+        for morpheme in ["a", "b", "ab"]:
+            Morpheme.objects.create(morpheme=morpheme)
+
+        parses = parse_morphology(u"ab" * 20, k=2, max_steps=5)
+        self.assertTrue(parses.truncated)
+        self.assertEqual(parses, [])
+
+        parses = parse_morphology(u"ab" * 20, k=2)
+        self.assertFalse(parses.truncated)
+        self.assertEqual(len(parses), 2)
+
+
+class FuzzySearchTests(TestCase):
+    def setUp(self):
+        self.word = Word.objects.create(word="hundo")
+        variant = Variant.objects.create(word=self.word, variant="hundo")
+        create_spelling_deletions(variant)
+
+    def test_one_mistake(self):
+        for text in ["hundjo", "hudno", "hundp", "undo"]:
+            self.assertEqual(
+                list(Word.objects.find_by_variant_fuzzy(text)), [self.word])
+
+    def test_two_mistakes(self):
+        self.assertEqual(list(Word.objects.find_by_variant_fuzzy("hudnjo")), [])
+        self.assertEqual(
+            list(Word.objects.find_by_variant_fuzzy("hudnjo", max_distance=2)),
+            [self.word])
+
+    def test_find_similar_limits(self):
+        for word in [u"hundi", u"hunda", u"hundejo"]:
+            word_obj = Word.objects.create(word=word)
+            Variant.objects.create(word=word_obj, variant=word)
+
+        (matches, truncated) = Word.objects.find_similar(u"hundo")
+        self.assertEqual([(word.word, distance) for (word, distance) in matches],
+                         [(u"hundo", 0), (u"hunda", 1), (u"hundi", 1),
+                          (u"hundejo", 2)])
+        self.assertFalse(truncated)
+
+        (matches, truncated) = Word.objects.find_similar(u"hundo", max_matches=2)
+        self.assertEqual([word.word for (word, distance) in matches],
+                         [u"hundo", u"hunda"])
+        self.assertTrue(truncated)
+
+        (matches, truncated) = Word.objects.find_similar(u"hundo", max_cells=10)
+        self.assertTrue(truncated)
+
+    def test_find_similar_ties_in_esperanto_order(self):
+        for word in [u"tati", u"ŝati", u"sati"]:
+            word_obj = Word.objects.create(word=word)
+            Variant.objects.create(word=word_obj, variant=word)
+
+        (matches, truncated) = Word.objects.find_similar(u"zati")
+        self.assertEqual([word.word for (word, distance) in matches],
+                         [u"sati", u"ŝati", u"tati"])
+
+
+# A small sample of the JSON dump produced by ReVo-utilities.
+SAMPLE_DICTIONARY = {
+    u"hundo": {
+        "primary": True,
+        "root": u"hund",
+        "definitions": [
+            {"primary definition": u"Besto, kiu bojas.",
+             "subdefinitions": [
+                 {"primary definition": u"Malbona homo.",
+                  "examples": [[u"Vi hundo!", None]],
+                  "translations": {"en": [u"cur"]}},
+             ],
+             "examples": [[u"La hundo bojas.", u"Z"]],
+             "remarks": [u"Ofta dombesto."],
+             "translations": {"en": [u"dog"], "fr": [u"chien"]}},
+            {"primary definition": u"Stelo.",
+             "subdefinitions": [],
+             "examples": [],
+             "remarks": [],
+             "translations": {}},
+        ],
+    },
+    u"ŝati": {
+        "primary": True,
+        "root": u"ŝat",
+        "definitions": [
+            {"primary definition": u"Trovi agrabla.",
+             "subdefinitions": [],
+             "examples": [],
+             "remarks": [],
+             "translations": {"en": [u"like"]}},
+        ],
+    },
+}
+
+
+class ImportTests(TestCase):
+    def test_populate_database(self):
+        populate_database(SAMPLE_DICTIONARY.items(), batch_size=7)
+
+        self.assertEqual(Word.objects.count(), 2)
+        hundo = Word.objects.get(word=u"hundo")
+        self.assertEqual(list(Word.objects.find_by_variant(u"hundojn")), [hundo])
+        self.assertEqual(list(Word.objects.find_by_variant(u"sxatas")),
+                         [Word.objects.get(word=u"ŝati")])
+        self.assertEqual(list(Word.objects.find_by_variant_fuzzy(u"hundp")), [hundo])
+
+        definitions = list(PrimaryDefinition.objects.for_word(hundo))
+        self.assertEqual([definition.definition for definition in definitions],
+                         [u"Besto, kiu bojas.", u"Stelo."])
+        self.assertEqual(definitions[0].subdefinition_set.get().definition,
+                         u"Malbona homo.")
+        self.assertEqual(definitions[0].remark_set.get().remark, u"Ofta dombesto.")
+        self.assertEqual(Translation.objects.filter(word=hundo).count(), 3)
+
+        self.assertEqual(
+            set(Morpheme.objects.values_list("morpheme", flat=True)),
+            set([u"hund", u"hundo", u"ŝat", u"unt"]))
+        self.assertEqual(Morpheme.objects.get(morpheme=u"hund").primary_word, hundo)
+
+        document = WordDocument.objects.get(word_id=u"hundo")
+        self.assertEqual(json.loads(document.document), hundo.as_json())
+
+    def test_populate_database_queries(self):
+        """The import makes the same queries however many words there
+        are, rather than some for each word.
+
+        """
+        def count_queries(dictionary):
+            Word.objects.all().delete()
+            Morpheme.objects.all().delete()
+
+            with CaptureQueriesContext(connection) as context:
+                populate_database(dictionary.items(), processes=1)
+            return len(context.captured_queries)
+
+        dictionary = dict(SAMPLE_DICTIONARY)
+        for number in range(20):
+            entry = copy.deepcopy(SAMPLE_DICTIONARY[u"hundo"])
+            entry["root"] = u"hund%d" % number
+            dictionary[u"hund%do" % number] = entry
+
+        self.assertEqual(count_queries(dictionary),
+                         count_queries(SAMPLE_DICTIONARY))
+
+        hundo = Word.objects.get(word=u"hundo")
+        document = WordDocument.objects.get(word_id=u"hundo")
+        self.assertEqual(json.loads(document.document), hundo.as_json())
+
+    def test_populate_database_in_parallel(self):
+        def dump_rows():
+            return (list(Word.objects.values_list("id", "word")),
+                    list(PrimaryDefinition.objects.values_list("id", "definition")),
+                    list(Translation.objects.values_list(
+                        "id", "definition_id", "language_code", "translation")),
+                    list(Morpheme.objects.values_list("id", "morpheme")))
+
+        populate_database(SAMPLE_DICTIONARY.items(), processes=1)
+        serial_rows = dump_rows()
+
+        Word.objects.all().delete()
+        Morpheme.objects.all().delete()
+
+        populate_database(SAMPLE_DICTIONARY.items(), processes=2)
+        self.assertEqual(dump_rows(), serial_rows)
+
+    def test_prepare_entry(self):
+        prepared = prepare_entry((u"hundo", SAMPLE_DICTIONARY[u"hundo"]))
+
+        [(variant, deletions)] = prepared["variants"]
+        self.assertEqual(variant, u"hundo")
+        self.assertIn(u"undojn", deletions)
+        self.assertEqual(prepared["morphemes"], [u"hund", u"hundo"])
+        self.assertEqual(prepared["entry_hash"],
+                         get_entry_hash(SAMPLE_DICTIONARY[u"hundo"]))
+
+    def test_populate_database_parses(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+
+        parses = parse_morphology(u"hundoj")
+        self.assertEqual([parse[0].morpheme for parse in parses], [u"hund"])
+
+    def test_iter_dictionary(self):
+        dump = StringIO(json.dumps(SAMPLE_DICTIONARY, indent=2))
+        self.assertEqual(dict(iter_dictionary(dump, read_size=10)),
+                         SAMPLE_DICTIONARY)
+
+    def test_iter_dictionary_newline_delimited(self):
+        lines = [json.dumps([word, entry])
+                 for (word, entry) in sorted(SAMPLE_DICTIONARY.items())]
+        dump = StringIO("\n".join(lines) + "\n")
+
+        self.assertEqual(list(iter_dictionary(dump, read_size=10)),
+                         sorted(SAMPLE_DICTIONARY.items()))
+
+    def test_iter_dictionary_empty(self):
+        self.assertEqual(list(iter_dictionary(StringIO(" {} "))), [])
+
+    def test_update_database(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+        sxati_id = Word.objects.get(word=u"ŝati").id
+
+        dictionary = copy.deepcopy(SAMPLE_DICTIONARY)
+        dictionary[u"hundo"]["definitions"].pop()
+        dictionary[u"kato"] = {
+            "primary": True,
+            "root": u"kat",
+            "definitions": [
+                {"primary definition": u"Besto, kiu miaŭas.",
+                 "subdefinitions": [],
+                 "examples": [],
+                 "remarks": [],
+                 "translations": {"en": [u"cat"]}},
+            ],
+        }
+
+        stats = update_database(dictionary.items())
+        self.assertEqual(stats, {'added': 1, 'changed': 1, 'deleted': 0})
+
+        # unchanged words are left alone
+        self.assertEqual(Word.objects.get(word=u"ŝati").id, sxati_id)
+
+        hundo = Word.objects.get(word=u"hundo")
+        self.assertEqual(PrimaryDefinition.objects.filter(word=hundo).count(), 1)
+        self.assertEqual(Morpheme.objects.get(morpheme=u"hund").primary_word, hundo)
+        document = json.loads(WordDocument.objects.get(word_id=u"hundo").document)
+        self.assertEqual(len(document["difinoj"]), 1)
+
+        kato = Word.objects.get(word=u"kato")
+        self.assertEqual(list(Word.objects.find_by_variant(u"katojn")), [kato])
+        self.assertEqual(Morpheme.objects.get(morpheme=u"kat").primary_word, kato)
+        self.assertTrue(WordDocument.objects.filter(word_id=u"kato").exists())
+
+        self.assertEqual(Morpheme.objects.filter(morpheme=u"unt").count(), 1)
+
+    def test_update_database_deletes(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+
+        dictionary = copy.deepcopy(SAMPLE_DICTIONARY)
+        del dictionary[u"ŝati"]
+
+        stats = update_database(dictionary.items())
+        self.assertEqual(stats, {'added': 0, 'changed': 0, 'deleted': 1})
+
+        self.assertFalse(Word.objects.filter(word=u"ŝati").exists())
+        self.assertFalse(Variant.objects.filter(variant=u"ŝati").exists())
+        self.assertFalse(Morpheme.objects.filter(morpheme=u"ŝat").exists())
+        self.assertFalse(Translation.objects.filter(translation=u"like").exists())
+
+    def test_import_dictionary_without_hashes(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+        # as imported before we stored hashes
+        Word.objects.update(entry_hash=None)
+
+        import_dictionary(SAMPLE_DICTIONARY.items())
+
+        self.assertEqual(Word.objects.count(), 2)
+        self.assertFalse(Word.objects.filter(entry_hash=None).exists())
+        self.assertEqual(Variant.objects.filter(variant=u"hundo").count(), 1)
+        self.assertEqual(Morpheme.objects.filter(morpheme=u"unt").count(), 1)
+
+    def test_check_database(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+
+        self.assertEqual(check_database(2, 2, [u"hundo", u"ŝati"]), [])
+        self.assertEqual(len(check_database(2, 2, [u"hundo", u"kato"])), 1)
+        # a truncated dump
+        self.assertEqual(len(check_database(2, 100, [u"hundo"])), 1)
+
+
+class ParseCacheTests(TestCase):
+    def setUp(self):
+        clear_parse_cache()
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_cached_parses(self):
+        word = Word.objects.create(word="persono")
+        Morpheme.objects.create(primary_word=word, morpheme="person")
+        parses = parse_morphology(u"persone")
+
+        self.assertEqual(cached_parse_morphology(u"persone"), parses)
+        hits = get_statistics()["hits"]
+
+        with self.assertNumQueries(0):
+            cached_parses = cached_parse_morphology(u"persone")
+
+        self.assertEqual(cached_parses, parses)
+        self.assertEqual(cached_parses[0][-1], "e")
+        self.assertEqual(get_statistics()["hits"], hits + 1)
+
+    def test_new_morphemes_are_found(self):
+        self.assertEqual(cached_parse_morphology(u"hundo"), [])
+
+        Morpheme.objects.create(morpheme="hund")
+        self.assertEqual(len(cached_parse_morphology(u"hundo")), 1)
+
+    def test_import_changes_version(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+        version = get_dictionary_version()
+        self.assertNotEqual(version, 0)
+
+        update_database(SAMPLE_DICTIONARY.items())
+        self.assertGreater(get_dictionary_version(), version)
+
+    @override_settings(PARSE_CACHE_BACKEND="default")
+    def test_shared_cache(self):
+        caches["default"].clear()
+        Morpheme.objects.create(morpheme="hund")
+        parses = cached_parse_morphology(u"hundo")
+
+        # another worker, with nothing in its own cache
+        clear_parse_cache()
+        shared_hits = get_statistics()["shared_hits"]
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_parse_morphology(u"hundo"), parses)
+        self.assertEqual(get_statistics()["shared_hits"], shared_hits + 1)
+
+
+def sleep_then_return(seconds, value):
+    time.sleep(seconds)
+    return value
+
+
+class SearchStageTests(TestCase):
+    """Stages here don't read any tables, since pool threads have
+    their own connections and can't see the test's transaction.
+
+    """
+    @override_settings(SEARCH_THREADS=4,
+                       SEARCH_TIMEOUTS={'a': 1.0, 'b': 1.0})
+    def test_stages_run_at_once(self):
+        start = time.time()
+        (results, incomplete) = run_stages([
+            ('a', sleep_then_return, (0.2, 1), None),
+            ('b', sleep_then_return, (0.2, 2), None),
+        ])
+
+        self.assertLess(time.time() - start, 0.35)
+        self.assertEqual(results, {'a': 1, 'b': 2})
+        self.assertEqual(incomplete, set())
+
+    @override_settings(SEARCH_THREADS=4,
+                       SEARCH_TIMEOUTS={'fast': 1.0, 'slow': 0.05})
+    def test_slow_stage_is_incomplete(self):
+        start = time.time()
+        (results, incomplete) = run_stages([
+            ('fast', sleep_then_return, (0, 1), None),
+            ('slow', sleep_then_return, (0.5, 2), 'default'),
+        ])
+
+        self.assertLess(time.time() - start, 0.3)
+        self.assertEqual(results, {'fast': 1, 'slow': 'default'})
+        self.assertEqual(incomplete, set(['slow']))
+
+    @override_settings(SEARCH_THREADS=1,
+                       SEARCH_TIMEOUTS={'fast': 0.2, 'slow': 0.05})
+    def test_abandoned_stage_doesnt_delay_next_search(self):
+        (results, incomplete) = run_stages([
+            ('slow', sleep_then_return, (0.3, 1), 'default'),
+        ])
+        self.assertEqual(incomplete, set(['slow']))
+
+        # the only thread is still busy, so we don't wait for it
+        start = time.time()
+        (results, incomplete) = run_stages([
+            ('fast', sleep_then_return, (0, 2), 'default'),
+        ])
+
+        self.assertLess(time.time() - start, 0.1)
+        self.assertEqual(results, {'fast': 'default'})
+        self.assertEqual(incomplete, set(['fast']))
+
+        # and once it's done, we use it again
+        time.sleep(0.35)
+        (results, incomplete) = run_stages([
+            ('fast', sleep_then_return, (0, 2), 'default'),
+        ])
+        self.assertEqual(results, {'fast': 2})
+        self.assertEqual(incomplete, set())
+
+    @override_settings(SEARCH_THREADS=1,
+                       SEARCH_TIMEOUTS={'slow': 0.05, 'queued': 0.05})
+    def test_abandoned_stage_never_starts(self):
+        calls = []
+
+        def call(value):
+            calls.append(value)
+            time.sleep(0.1)
+
+        (results, incomplete) = run_stages([
+            ('slow', call, ('slow',), None),
+            ('queued', call, ('queued',), None),
+        ])
+        self.assertEqual(incomplete, set(['slow', 'queued']))
+
+        time.sleep(0.2)
+        self.assertEqual(calls, ['slow'])
+
+    @override_settings(SEARCH_THREADS=1,
+                       SEARCH_TIMEOUTS={'query': 0.05, 'fast': 0.2})
+    def test_slow_query_is_interrupted(self):
+        def count_forever():
+            cursor = connection.cursor()
+            cursor.execute(
+                "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 "
+                "FROM c) SELECT count(*) FROM (SELECT x FROM c LIMIT 1e10)")
+            return cursor.fetchall()
+
+        (results, incomplete) = run_stages([
+            ('query', count_forever, (), 'default'),
+        ])
+        self.assertEqual(results, {'query': 'default'})
+
+        # the thread is free again soon after the deadline
+        time.sleep(0.05)
+        (results, incomplete) = run_stages([
+            ('fast', sleep_then_return, (0, 2), None),
+        ])
+        self.assertEqual(results, {'fast': 2})
+
+    @override_settings(SEARCH_THREADS=0, SEARCH_TIMEOUTS={'slow': 0.05})
+    def test_without_threads(self):
+        (results, incomplete) = run_stages([
+            ('slow', sleep_then_return, (0.1, 2), 'default'),
+        ])
+        self.assertEqual(results, {'slow': 2})
+        self.assertEqual(incomplete, set())
+
+    def test_search(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+        hundo = Word.objects.get(word=u"hundo")
+
+        results = search(u"hundoj")
+        self.assertEqual(results.matching_words, [hundo])
+        self.assertEqual(results.similar_words, [])
+        self.assertEqual([parse[0].morpheme for parse in results.parses],
+                         [u"hund"])
+        self.assertEqual(results.incomplete, set())
+
+        results = search(u"dog")
+        self.assertEqual([translation.word for translation
+                          in results.translations], [hundo])
+
+
+class CoalesceTests(TestCase):
+    def call_at_once(self, function, count=5):
+        """Call function from count threads at the same time, and
+        return what each call returned.
+
+        """
+        results = [None] * count
+
+        def call(i):
+            results[i] = function()
+
+        threads = [threading.Thread(target=call, args=(i,))
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def test_single_flight(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        def slow_function():
+            calls.append(1)
+            time.sleep(0.1)
+            return len(calls)
+
+        results = self.call_at_once(
+            lambda: single_flight.call("key", None, slow_function))
+
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(single_flight.shared, 4)
+
+        # finished calls aren't reused
+        self.assertEqual(single_flight.call("key", None, slow_function), 2)
+
+    def test_single_flight_exception(self):
+        single_flight = SingleFlight()
+
+        def failing_function():
+            time.sleep(0.1)
+            raise ValueError()
+
+        def call():
+            try:
+                single_flight.call("key", None, failing_function)
+            except ValueError:
+                return "raised"
+
+        self.assertEqual(self.call_at_once(call), ["raised"] * 5)
+
+    def test_single_flight_timeout(self):
+        single_flight = SingleFlight()
+        leader_started = threading.Event()
+        release_leader = threading.Event()
+
+        def hanging_function():
+            leader_started.set()
+            release_leader.wait()
+            return "leader"
+
+        leader = threading.Thread(
+            target=single_flight.call, args=("key", None, hanging_function))
+        leader.start()
+        leader_started.wait()
+
+        try:
+            result = single_flight.call("key", 0.05, lambda: "waiter")
+        finally:
+            release_leader.set()
+            leader.join()
+
+        self.assertEqual(result, "waiter")
+
+    def test_coalesced_results_are_not_modified(self):
+        single_flight = SingleFlight()
+        hundo = Word.objects.create(word=u"hundo")
+        translations = [
+            Translation(word=hundo, translation=u"Hund", language_code=u"de"),
+            Translation(word=hundo, translation=u"dog", language_code=u"en"),
+            Translation(word=hundo, translation=u"chien", language_code=u"fr"),
+        ]
+        results = SearchResults([hundo], [], False, Parses(),
+                                list(translations), set())
+
+        def slow_search():
+            time.sleep(0.1)
+            return results
+
+        def search_and_render():
+            shared_results = single_flight.call("key", None, slow_search)
+            return render_to_string("search.html", {
+                'search_term': u"hundo",
+                'matching_words': shared_results.matching_words,
+                'similar_words': shared_results.similar_words,
+                'similar_truncated': shared_results.similar_truncated,
+                'potential_parses': shared_results.parses,
+                'translations': group_translations(
+                    shared_results.translations),
+                'incomplete': shared_results.incomplete})
+
+        pages = self.call_at_once(search_and_render, count=2)
+
+        self.assertEqual(single_flight.shared, 1)
+        self.assertEqual(pages[0], pages[1])
+        self.assertEqual(results.translations, translations)
+
+    def test_shared_single_flight(self):
+        cache = caches["default"]
+        cache.clear()
+
+        # another worker is already searching
+        cache.add("key:lock", True)
+
+        def other_worker():
+            time.sleep(0.05)
+            cache.set("key:result", "theirs")
+            cache.delete("key:lock")
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        result = shared_single_flight(cache, "key", 1, None, lambda: "ours")
+        thread.join()
+
+        self.assertEqual(result, "theirs")
+
+    def test_shared_single_flight_gives_up(self):
+        cache = caches["default"]
+        cache.clear()
+        cache.add("key:lock", True)
+
+        self.assertEqual(
+            shared_single_flight(cache, "key", 0.05, None, lambda: "ours"),
+            "ours")
+
+    def test_shared_single_flight_incomplete(self):
+        cache = caches["default"]
+        cache.clear()
+        is_complete = lambda result: result != "partial"
+
+        # another worker is already searching, but doesn't finish
+        cache.add("key:lock", True)
+
+        def other_worker():
+            time.sleep(0.05)
+            cache.set("key:waiters", "partial")
+            cache.delete("key:lock")
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        result = shared_single_flight(cache, "key", 1, is_complete,
+                                      lambda: "ours")
+        thread.join()
+
+        # we were waiting, so we get it
+        self.assertEqual(result, "partial")
+
+    def test_shared_single_flight_doesnt_keep_incomplete(self):
+        cache = caches["default"]
+        cache.clear()
+        is_complete = lambda result: result != "partial"
+
+        shared_single_flight(cache, "key", 1, is_complete, lambda: "partial")
+
+        # workers that come later try again
+        self.assertEqual(
+            shared_single_flight(cache, "key", 1, is_complete, lambda: "ours"),
+            "ours")
+
+    @override_settings(SEARCH_COALESCE_BACKEND="default")
+    def test_search_between_workers(self):
+        caches["default"].clear()
+        populate_database(SAMPLE_DICTIONARY.items())
+        results = search(u"hundoj")
+
+        with self.assertNumQueries(0):
+            shared_results = search(u"hundoj")
+
+        self.assertEqual(shared_results.matching_words, results.matching_words)
+        self.assertEqual(shared_results.parses, results.parses)
+
+
+class CaptureStatements(CaptureQueriesContext):
+    """Like CaptureQueriesContext, but each captured 'sql' is a tuple
+    (sql, params), so we can EXPLAIN the queries. Django 1.8 only
+    gives us the SQL as text for SQLite.
+
+    """
+    def __enter__(self):
+        self.connection.ops.last_executed_query = (
+            lambda cursor, sql, params: (sql, params))
+        return super(CaptureStatements, self).__enter__()
+
+    def __exit__(self, *args):
+        del self.connection.ops.last_executed_query
+        super(CaptureStatements, self).__exit__(*args)
+
+
+class QueryTests(TestCase):
+    """Our pages should make a fixed number of queries, and every query
+    should use an index rather than reading a whole table.
+
+    """
+    def setUp(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+
+    def get_statements(self, url):
+        """Return the (sql, params) of every query made serving url,
+        once the in-memory caches are warm.
+
+        """
+        self.client.get(url)
+
+        with CaptureStatements(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        return [query['sql'] for query in context.captured_queries]
+
+    def get_plan(self, sql, params):
+        cursor = connection.cursor()
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+    def assertQueries(self, url, count):
+        statements = self.get_statements(url)
+        self.assertEqual(len(statements), count)
+
+        for (sql, params) in statements:
+            for step in self.get_plan(sql, params):
+                self.assertFalse(step.startswith("SCAN"),
+                                 "%s\n%s" % (sql, step))
+
+    def test_search_word(self):
+        self.assertQueries(reverse("search_word") + "?s=hundojn", 4)
+
+    def test_search_translation(self):
+        self.assertQueries(reverse("search_word") + "?s=dog", 3)
+
+    def test_view_word(self):
+        self.assertQueries(reverse("view_word", args=[u"hundo"]), 8)
+
+    def test_api_search_word(self):
+        self.assertQueries(reverse("api_search_word", args=[u"hundojn"]), 4)
+
+    def test_api_view_word(self):
+        self.assertQueries(reverse("api_view_word", args=[u"hundo"]), 1)
+
+    def test_translation_index(self):
+        translations = Translation.objects.filter(
+            translation=u"dog", language_code=u"en")
+        (sql, params) = translations.query.sql_with_params()
+
+        plan = " ".join(self.get_plan(sql, params))
+        self.assertIn("(translation=? AND language_code=?)", plan)
+
+
+class HttpCacheTests(TestCase):
+    def setUp(self):
+        populate_database(SAMPLE_DICTIONARY.items())
+        self.url = reverse("view_word", args=[u"hundo"])
+
+    def test_cache_headers(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.has_header("ETag"))
+        self.assertTrue(response.has_header("Last-Modified"))
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("max-age=86400", response["Cache-Control"])
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_if_modified_since_ignored(self):
+        last_modified = self.client.get(self.url)["Last-Modified"]
+
+        # we might have changed HTTP_CACHE_VERSION since
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_version_changes_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.settings(HTTP_CACHE_VERSION=2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_parameter_order(self):
+        url = reverse("search_word")
+        etag = self.client.get(url, [("s", u"hundo"), ("distanco", "2")])["ETag"]
+
+        response = self.client.get(
+            url + "?distanco=2&s=hundo", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(
+            url + "?s=hundoj", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_import_changes_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        update_database(SAMPLE_DICTIONARY.items())
+        dictionary_changed.send(sender=self.__class__)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_other_pages_not_cached(self):
+        response = self.client.get(reverse("about"))
+        self.assertFalse(response.has_header("ETag"))
+
+    def test_incomplete_search_not_cached(self):
+        url = reverse("search_word") + "?s=hundo"
+        incomplete = SearchResults([], [], False, Parses(), [],
+                                   set(["exact"]))
+
+        # as if every stage missed its deadline
+        self.addCleanup(setattr, views, "search", views.search)
+        views.search = lambda search_term, max_distance: incomplete
+
+        response = self.client.get(url)
+        self.assertFalse(response.has_header("ETag"))
+        self.assertIn("max-age=0", response["Cache-Control"])
+
+
+@override_settings(PAGE_CACHE_BACKEND="default")
+class PageCacheTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        populate_database(SAMPLE_DICTIONARY.items())
+
+    def test_word_page(self):
+        url = reverse("view_word", args=[u"hundo"])
+        content = self.client.get(url).content
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.content, content)
+
+    def test_equivalent_searches(self):
+        url = reverse("search_word")
+        content = self.client.get(url, {"s": u"hundojn"}).content
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"s": u" Hundojn"})
+        self.assertEqual(response.content, content)
+
+        # a different distance is a different page
+        with self.assertNumQueries(0):
+            self.client.get(url, {"s": u"hundojn", "distanco": "1"})
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url, {"s": u"hundojn", "distanco": "2"})
+        self.assertGreater(len(context.captured_queries), 0)
+
+    def test_direct_search_redirects(self):
+        url = reverse("search_word")
+        self.client.get(url, {"s": u"hundo"})
+
+        response = self.client.get(url, {"s": u"hundo", "rekte": ""})
+        self.assertEqual(response.status_code, 302)
+
+    def test_import_replaces_pages(self):
+        url = reverse("view_word", args=[u"hundo"])
+        self.client.get(url)
+
+        update_database(SAMPLE_DICTIONARY.items())
+        dictionary_changed.send(sender=self.__class__)
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        self.assertGreater(len(context.captured_queries), 0)
+
+    def test_incomplete_search_not_kept(self):
+        url = reverse("search_word") + "?s=hundo"
+        incomplete = SearchResults([], [], False, Parses(), [],
+                                   set(["exact"]))
+
+        # as if every stage missed its deadline
+        self.addCleanup(setattr, views, "search", views.search)
+        views.search = lambda search_term, max_distance: incomplete
+        self.client.get(url)
+        views.search = search
+
+        response = self.client.get(url)
+        self.assertIn(reverse("view_word", args=[u"hundo"]),
+                      response.content.decode("utf-8"))
+
+
+# The tables syncdb created before we had migrations.
+BASELINE_SCHEMA = [
+    """CREATE TABLE "vortaro_word" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, "word" varchar(50) NOT NULL UNIQUE)""",
+    """CREATE TABLE "vortaro_definition" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, "definition" text NULL)""",
+    """CREATE TABLE "vortaro_primarydefinition" ("definition_ptr_id" integer NOT NULL PRIMARY KEY REFERENCES "vortaro_definition" ("id"), "word_id" integer NOT NULL REFERENCES "vortaro_word" ("id"))""",
+    """CREATE TABLE "vortaro_subdefinition" ("definition_ptr_id" integer NOT NULL PRIMARY KEY REFERENCES "vortaro_definition" ("id"), "root_definition_id" integer NOT NULL REFERENCES "vortaro_primarydefinition" ("definition_ptr_id"))""",
+    """CREATE TABLE "vortaro_example" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, "definition_id" integer NOT NULL REFERENCES "vortaro_definition" ("id"), "example" text NOT NULL, "source" text NULL)""",
+    """CREATE TABLE "vortaro_remark" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, "definition_id" integer NOT NULL REFERENCES "vortaro_definition" ("id"), "remark" text NOT NULL)""",
+    """CREATE TABLE "vortaro_variant" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, "word_id" integer NOT NULL REFERENCES "vortaro_word" ("id"), "variant" varchar(50) NOT NULL)""",
+    """CREATE TABLE "vortaro_morpheme" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, "primary_word_id" integer NULL REFERENCES "vortaro_word" ("id"), "morpheme" varchar(50) NOT NULL UNIQUE)""",
+    """CREATE TABLE "vortaro_translation" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, "word_id" integer NOT NULL REFERENCES "vortaro_word" ("id"), "definition_id" integer NOT NULL REFERENCES "vortaro_definition" ("id"), "translation" text NOT NULL, "language_code" varchar(10) NOT NULL)""",
+]
+
+
+class MigrationTests(TestCase):
+    def test_migrate_baseline_database(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        # migrations look their connection up by alias
+        connections.databases["baseline"] = dict(
+            connection.settings_dict, NAME=os.path.join(directory, "word_db"))
+        baseline = connections["baseline"]
+        self.addCleanup(connections.databases.pop, "baseline")
+        self.addCleanup(delattr, connections._connections, "baseline")
+        self.addCleanup(baseline.close)
+
+        cursor = baseline.cursor()
+        for statement in BASELINE_SCHEMA:
+            cursor.execute(statement)
+        cursor.execute("INSERT INTO vortaro_word (word) VALUES (%s)",
+                       [u"ĉevalo"])
+
+        # as migrate --fake-initial does
+        executor = MigrationExecutor(baseline)
+        executor.migrate(executor.loader.graph.leaf_nodes(),
+                         fake_initial=True)
+
+        introspection = baseline.introspection
+        cursor = baseline.cursor()
+        tables = introspection.table_names(cursor)
+        self.assertIn("vortaro_spellingdeletion", tables)
+        self.assertIn("vortaro_worddocument", tables)
+
+        cursor.execute("SELECT entry_hash, sort_key FROM vortaro_word")
+        self.assertEqual(cursor.fetchall(),
+                         [(None, esperanto_sort_key(u"ĉevalo"))])
+
+        self.assertIn("variant",
+                      introspection.get_indexes(cursor, "vortaro_variant"))
+
+
+class ConnectionTests(TestCase):
+    @override_settings(SQLITE_PRAGMAS=(("query_only", "ON"), ("temp_store", "MEMORY")))
+    def test_pragmas(self):
+        settings_dict = dict(connection.settings_dict, NAME=":memory:")
+        new_connection = DatabaseWrapper(settings_dict, alias="pragma_test")
+        self.addCleanup(new_connection.close)
+
+        cursor = new_connection.cursor()
+        cursor.execute("PRAGMA temp_store")
+        # 2 is MEMORY
+        self.assertEqual(cursor.fetchone(), (2,))
+
+        with self.assertRaises(DatabaseError):
+            cursor.execute("CREATE TABLE foo (bar INTEGER)")
+
+    @override_settings(SQLITE_PRAGMAS=(("query_only", "ON"),))
+    def test_allow_writes_after_reopening(self):
+        settings_dict = dict(connection.settings_dict, NAME=":memory:")
+        new_connection = DatabaseWrapper(settings_dict, alias="pragma_test")
+        self.addCleanup(new_connection.close)
+
+        allow_writes(new_connection)
+        # migrate closes the connection part way through
+        new_connection.close()
+
+        new_connection.cursor().execute("CREATE TABLE foo (bar INTEGER)")
+
+
+class DatabaseSwitchTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.live_path = os.path.join(self.directory, "word_db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def create_version(self, version):
+        path = get_version_path(self.live_path, version)
+        with open(path, "w") as f:
+            f.write(version)
+        return path
+
+    def create_old_style_database(self):
+        """Create a word_db that isn't a link, last written in 2014."""
+        with open(self.live_path, "w") as f:
+            f.write("live")
+
+        modified = time.mktime((2014, 1, 1, 0, 0, 0, 0, 0, -1))
+        os.utime(self.live_path, (modified, modified))
+
+    def test_switch_database(self):
+        self.create_old_style_database()
+
+        versions = ["20150101000000", "20150102000000", "20150103000000"]
+        for version in versions:
+            switch_database(self.live_path, self.create_version(version))
+            with open(self.live_path) as f:
+                self.assertEqual(f.read(), version)
+
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ["word_db", "word_db.20150102000000",
+                          "word_db.20150103000000"])
+
+    def test_first_switch_keeps_old_database(self):
+        self.create_old_style_database()
+
+        switch_database(self.live_path, self.create_version("20150101000000"))
+
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ["word_db", "word_db.20140101000000",
+                          "word_db.20150101000000"])
+        with open(get_version_path(self.live_path, "20140101000000")) as f:
+            self.assertEqual(f.read(), "live")
+
+    def test_middleware_notices_switch(self):
+        live_path = self.live_path
+
+        class Middleware(ReopenDatabaseMiddleware):
+            def get_database_path(self):
+                return live_path
+
+        changes = []
+        def receiver(**kwargs):
+            changes.append(kwargs)
+        dictionary_changed.connect(receiver)
+        self.addCleanup(dictionary_changed.disconnect, receiver)
+
+        middleware = Middleware()
+        request = RequestFactory().get("/")
+
+        switch_database(self.live_path, self.create_version("1"))
+        middleware.process_request(request)
+        middleware.process_request(request)
+        self.assertEqual(len(changes), 0)
+
+        switch_database(self.live_path, self.create_version("2"))
+        middleware.process_request(request)
+        self.assertEqual(len(changes), 1)
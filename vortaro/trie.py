@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""Simple character tries. We use these to hold strings from the
+database in memory, so we can answer questions like 'which morphemes
+are prefixes of this string?' in a single walk rather than a query
+per prefix.
+
+"""
+from array import array
+from bisect import bisect_left
+import sys
+
+# Key used to store a value on a node. Every other key is a single
+# character, so this can't clash.
+VALUE = None
+
+
+class Trie(object):
+    """A mapping from strings to values, stored as nested dicts of
+    characters.
+
+    >>> trie = Trie()
+    >>> trie.add('per', 1)
+    >>> trie.add('person', 2)
+    >>> list(trie.prefixes('persone'))
+    [(3, 1), (6, 2)]
+
+    """
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def add(self, key, value):
+        """Store value under key, replacing any existing value."""
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+
+        if VALUE not in node:
+            self.size += 1
+        node[VALUE] = value
+
+    def get(self, key, default=None):
+        """Return the value stored under key, or default."""
+        node = self.root
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return default
+
+        return node.get(VALUE, default)
+
+    def prefixes(self, text):
+        """Yield a tuple (length, value) for every key in the trie that
+        is a prefix of text, shortest first.
+
+        """
+        node = self.root
+        for i, char in enumerate(text):
+            node = node.get(char)
+            if node is None:
+                return
+            if VALUE in node:
+                yield (i + 1, node[VALUE])
+
+
+# Sorts after every other character, so every key starting with
+# prefix sorts before prefix + LAST_CHARACTER.
+LAST_CHARACTER = unichr(sys.maxunicode)
+
+
+class PackedTrie(object):
+    """A read-only trie mapping strings to lists of integers, built
+    from a dict. Rather than a dict for every node, we keep the keys in
+    a sorted list, where the keys below a node are the ones between two
+    bisections. This takes a fraction of the memory of Trie, which
+    matters for the hundreds of thousands of keys in the variant trie.
+
+    >>> trie = PackedTrie({u'per': [1], u'person': [2, 3], u'pes': [4]})
+    >>> trie.get(u'person')
+    [2, 3]
+    >>> list(trie.items_by_length(u'per'))
+    [(u'per', [1]), (u'person', [2, 3])]
+    >>> trie.search(u'persno', 1)
+    ([(u'person', [2, 3], 1)], False)
+
+    """
+    def __init__(self, items):
+        self.keys = sorted(items)
+
+        # the values of keys[i] are values[offsets[i]:offsets[i + 1]]
+        self.values = array('l')
+        self.offsets = array('l', [0])
+        for key in self.keys:
+            self.values.extend(items[key])
+            self.offsets.append(len(self.values))
+
+        # length -> (sorted keys of that length, their indexes in keys)
+        self.keys_by_length = {}
+        for (i, key) in enumerate(self.keys):
+            (keys, indexes) = self.keys_by_length.setdefault(
+                len(key), ([], array('l')))
+            keys.append(key)
+            indexes.append(i)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get_values(self, i):
+        return self.values[self.offsets[i]:self.offsets[i + 1]].tolist()
+
+    def get(self, key, default=None):
+        """Return the values stored under key, or default."""
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.get_values(i)
+        return default
+
+    def items_by_length(self, prefix):
+        """Yield a tuple (key, values) for every key in the trie that
+        starts with prefix, shortest keys first. This is lazy, so
+        callers that only want the first few keys only look at the
+        shortest.
+
+        """
+        for length in sorted(self.keys_by_length):
+            if length < len(prefix):
+                continue
+
+            (keys, indexes) = self.keys_by_length[length]
+            start = bisect_left(keys, prefix)
+            end = bisect_left(keys, prefix + LAST_CHARACTER, start)
+            for i in range(start, end):
+                yield (keys[i], self.get_values(indexes[i]))
+
+    def search(self, text, max_distance, max_steps=None):
+        """Find every key within max_distance edits of text, counting
+        insertions, deletions, replacements and transpositions of
+        adjacent letters (see spelling.edit_distance).
+
+        We walk the trie computing one row of the edit distance table
+        per node, and skip any branch whose row is already too
+        distant. If max_steps is given, we stop after visiting that
+        many nodes.
+
+        Returns a tuple (matches, truncated), where matches is a list
+        of (key, values, distance) tuples, nearest first.
+
+        """
+        # rows[d] is the row for the node path[:d]. Consecutive keys
+        # share the rows of their common prefix, so we visit each
+        # node once, as if we were walking nested dicts.
+        path = u''
+        rows = [range(len(text) + 1)]
+        matches = []
+        steps = 0
+        truncated = False
+
+        i = 0
+        while i < len(self.keys):
+            key = self.keys[i]
+
+            shared = 0
+            for (path_char, char) in zip(path, key):
+                if path_char != char:
+                    break
+                shared += 1
+            del rows[shared + 1:]
+
+            pruned = False
+            for depth in range(shared, len(key)):
+                steps += 1
+                if max_steps is not None and steps > max_steps:
+                    truncated = True
+                    break
+
+                char = key[depth]
+                row = rows[depth]
+                previous_row = rows[depth - 1] if depth > 0 else None
+
+                new_row = [row[0] + 1]
+                for j in range(1, len(text) + 1):
+                    replace_cost = 0 if text[j-1] == char else 1
+                    distance = min(row[j] + 1, new_row[j-1] + 1,
+                                   row[j-1] + replace_cost)
+
+                    if (j > 1 and previous_row is not None and
+                        text[j-2] == char and text[j-1] == key[depth-1]):
+                        distance = min(distance, previous_row[j-2] + 1)
+
+                    new_row.append(distance)
+
+                rows.append(new_row)
+
+                # no key below here can get any closer
+                if min(new_row) > max_distance:
+                    pruned = True
+                    break
+
+            path = key[:len(rows) - 1]
+            if truncated:
+                break
+
+            if pruned:
+                i = bisect_left(self.keys, path + LAST_CHARACTER, i)
+                continue
+
+            if rows[-1][-1] <= max_distance:
+                matches.append((key, self.get_values(i), rows[-1][-1]))
+            i += 1
+
+        matches.sort(key=lambda match: (match[2], match[0]))
+        return (matches, truncated)
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 from django.shortcuts import render, redirect
 from django.core.urlresolvers import reverse
+from django.utils.cache import add_never_cache_headers
 
-from models import Word, PrimaryDefinition, Subdefinition, Example, Remark, Translation
-from .morphology import parse_morphology, canonicalise_word
-from .esperanto_sort import compare_esperanto_strings
+from models import Word, PrimaryDefinition
+from .morphology import MAX_SEARCH_TERM_LENGTH, canonicalise_word
+from .page_cache import cache_page_by_dictionary
+from .search import search
+from .esperanto_sort import esperanto_sort_key
+from .spelling import parse_max_distance
 
 
 def about(request):
@@ -30,6 +34,30 @@ def index(request):
     return render(request, 'index.html')
 
 
+# letters we link to when browsing the dictionary
+ALPHABET = u"abcĉdefgĝhĥijĵklmnoprsŝtuŭvz"
+
+
+def browse_words(request):
+    """List words in alphabetical order, a page at a time. Pages start
+    at the word given in 'de' and stop before the word given in 'al'.
+
+    """
+    start = request.GET.get('de', u'').strip()
+    end = request.GET.get('al', u'').strip()
+
+    (words, next_word) = Word.objects.browse(start, end)
+
+    return render(request, 'browse.html',
+                  {'words': words, 'next_word': next_word,
+                   'start': start, 'end': end, 'alphabet': ALPHABET})
+
+
+def get_word_page_key(request, word):
+    return word
+
+
+@cache_page_by_dictionary(get_word_page_key)
 def view_word(request, word):
     # get the word
     try:
@@ -39,39 +67,33 @@ def view_word(request, word):
         redirect_url = reverse('search_word')
         return redirect(redirect_url + u"?s=" + word)
 
-    # get definitions
-    definitions = PrimaryDefinition.objects.filter(word=word_obj)
+    # get definitions, along with their examples, remarks,
+    # subdefinitions and translations
+    definitions = PrimaryDefinition.objects.for_word(word_obj)
 
-    # get any examples, remarks, subdefinitions and subdefinition examples
     definition_trees = []
+    translations = []
     for definition in definitions:
-        examples = Example.objects.filter(definition=definition)
-
-        remarks = Remark.objects.filter(definition=definition)
+        subdefinitions = definition.subdefinition_set.all()
 
-        # get subdefinitions with index and examples
+        # get subdefinitions with examples
         # e.g. [('ĉ the definition', ['blah', 'blah blah']
-        subdefinitions = Subdefinition.objects.filter(root_definition=definition)
-        subdefs_with_examples = []
-        for i in range(subdefinitions.count()):
-            sub_examples = Example.objects.filter(definition=subdefinitions[i])
-            subdefs_with_examples.append((subdefinitions[i].definition,
-                                          sub_examples))
+        subdefs_with_examples = [
+            (subdefinition.definition, subdefinition.example_set.all())
+            for subdefinition in subdefinitions]
 
         # we want to count according the esperanto alphabet for subdefinitions
-        definition_trees.append((definition, remarks, examples,
+        definition_trees.append((definition, definition.remark_set.all(),
+                                 definition.example_set.all(),
                                  subdefs_with_examples))
 
-    # get translations for every definition and subdefinition
-    translations = []
-    for definition in definitions:
-        definition_translations = list(Translation.objects.filter(definition=definition))
+        # get translations for every definition and subdefinition
+        definition_translations = list(definition.translation_set.all())
         definition_translations = group_translations(definition_translations)
 
-        subdefinitions = Subdefinition.objects.filter(root_definition=definition)
         subdefinitions_translations = []
         for subdefinition in subdefinitions:
-            subdefinition_translations = list(Translation.objects.filter(definition=subdefinition))
+            subdefinition_translations = list(subdefinition.translation_set.all())
             subdefinition_translations = group_translations(subdefinition_translations)
 
             if subdefinition_translations:
@@ -85,56 +107,69 @@ def view_word(request, word):
                    'translations': translations})
 
 
-def search_word(request):
+def get_search_term(request):
     query = request.GET[u's'].strip()
     search_term = canonicalise_word(query)
 
     # if search term is stupidly long, truncate it
-    if len(search_term) > 40:
-        search_term = search_term[:40]
+    search_term = search_term[:MAX_SEARCH_TERM_LENGTH]
 
-    matching_words = Word.objects.find_by_variant(search_term)
-    
-    # allow users to go directly to a word definition if we can find one
+    return search_term
+
+
+def get_search_page_key(request):
+    # we might redirect straight to the word instead
     if 'rekte' in request.GET:
-        if matching_words:
-            return redirect('view_word', matching_words[0].word)
+        return None
 
-    # Fuzzy search, discarding words already found in the precise search.
-    similar_words = set(Word.objects.find_by_variant_fuzzy(search_term))
-    similar_words = similar_words - set(matching_words)
+    max_distance = parse_max_distance(request.GET.get('distanco'))
+    return u"%d:%s" % (max_distance, get_search_term(request))
 
-    # get morphological parsing results
-    # of form [['konk', 'lud'], ['konklud']]
-    potential_parses = parse_morphology(search_term)
 
-    # get matching translations, ignoring changes we made for
-    # esperanto words
-    translations = translation_search(search_term)
+@cache_page_by_dictionary(get_search_page_key)
+def search_word(request):
+    search_term = get_search_term(request)
+
+    # allow users to go directly to a word definition if we can find one
+    if 'rekte' in request.GET:
+        matching_words = Word.objects.find_by_variant(search_term)
+        if matching_words:
+            return redirect('view_word', matching_words[0].word)
 
-    return render(request, 'search.html',
-                  {'search_term':search_term,
-                   'matching_words': matching_words,
-                   'similar_words':similar_words,
-                   'potential_parses':potential_parses,
-                   'translations':translations})
+    # Exact matches, similar words (users can ask us to tolerate more
+    # mistakes), parses of compound words and translations, all
+    # looked up at once. See search.py.
+    max_distance = parse_max_distance(request.GET.get('distanco'))
+    results = search(search_term, max_distance)
 
+    response = render(request, 'search.html',
+                      {'search_term':search_term,
+                       'matching_words': results.matching_words,
+                       'similar_words': results.similar_words,
+                       'similar_truncated': results.similar_truncated,
+                       'potential_parses': results.parses,
+                       'translations': group_translations(results.translations),
+                       'incomplete': results.incomplete})
 
-def translation_search(search_term):
-    translations = list(Translation.objects.filter(translation=search_term))
+    # the same search may finish in time later, so don't let browsers
+    # keep this one
+    if results.incomplete:
+        add_never_cache_headers(response)
+    return response
 
-    return group_translations(translations)
 
 def group_translations(translations):
     """Given a list of translations, group into a list of lists where each
-    sublist only contains translations of one language. Assumes the list is
-    already sorted by language.
+    sublist only contains translations of one language, sorted by
+    language. translations itself is left alone, since search results
+    may be shared with other requests.
 
     """
     if not translations:
         return []
 
-    translations.sort(key=(lambda t: t.language), cmp=compare_esperanto_strings)
+    translations = sorted(translations,
+                          key=lambda t: esperanto_sort_key(t.language))
 
     grouped_translations = [[translations[0]]]
     for translation in translations[1:]: